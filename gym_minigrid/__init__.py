@@ -1,5 +1,6 @@
 from gym.envs.registration import register
 from gym_minigrid.minigrid import Wall
+from gym_minigrid.babaisyou import BabaIsYouGrid
 
 def register_minigrid_envs():
     # register BabaIsYou envs
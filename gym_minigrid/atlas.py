@@ -0,0 +1,167 @@
+import argparse
+import json
+
+import numpy as np
+
+from gym_minigrid.babaisyou import BabaIsYouGrid, pack_obj
+from gym_minigrid.envs.core.flexible_world_object import (FBall, FDoor, FKey, FWall, Baba, RuleIs, RuleObject,
+                                                          RuleProperty, objects, properties)
+from gym_minigrid.minigrid import COLORS, COLOR_TO_IDX, OBJECT_TO_IDX, TILE_PIXELS, Wall
+
+# Types of the objects whose tile depends on their direction
+DIRECTIONAL_TYPES = {"baba"}
+
+# Size in bytes of the length of the header of an atlas file
+HEADER_LENGTH_SIZE = 8
+
+
+def atlas_objects():
+    """
+    Make one object of each kind of tile that can be rendered in a BabaIsYou grid (the empty tile excluded)
+    """
+    objs = []
+    for color in COLORS:
+        objs += [FWall(color), FBall(color), FDoor(color), FKey(color), Wall(color)]
+    for color in list(COLORS) + ["white"]:
+        for direction in range(4):
+            baba = Baba(color)
+            baba.dir = direction
+            objs.append(baba)
+    objs += [RuleObject(obj) for obj in objects] + [RuleProperty(prop) for prop in properties] + [RuleIs()]
+    return objs
+
+
+class TileAtlas:
+    """
+    Pre-rendered tiles of a BabaIsYou grid, without and with highlight, for one or more tile sizes.
+
+    The atlas can be saved in a single file and loaded back as read-only memory-mapped arrays, which avoids rendering
+    the tiles in every process using them. A tile is identified by the (type, color, dir, flags) record of its
+    object (see babaisyou.pack_obj), the direction being ignored for the objects that are not directional.
+    """
+
+    def __init__(self, keys, tiles, subdivs=3):
+        """
+        :param keys: (type, color, dir, flags) names of the tiles, the type of the empty tile is "empty"
+        :param tiles: dict mapping a tile size to the (len(keys), 2, tile_size, tile_size, 3) array of tiles
+        :param subdivs: number of subdivisions of the tiles used for anti-aliasing
+        """
+        self.keys = [tuple(key) for key in keys]
+        self.tiles = tiles
+        self.subdivs = subdivs
+        self.tile_sizes = sorted(tiles)
+
+        self.index_of = {}
+        self.directional = set()
+        for k, (type, color, direction, flags) in enumerate(self.keys):
+            if type in OBJECT_TO_IDX and color in COLOR_TO_IDX:
+                self.index_of[(OBJECT_TO_IDX[type], COLOR_TO_IDX[color], direction, flags)] = k
+                if type in DIRECTIONAL_TYPES:
+                    self.directional.add(OBJECT_TO_IDX[type])
+
+    @classmethod
+    def build(cls, tile_sizes=(TILE_PIXELS,), subdivs=3):
+        """
+        Render all the tiles of a BabaIsYou grid
+        """
+        objs = [None] + atlas_objects()
+        keys = [("empty", "red", 0, 0)] + [cls.key(obj) for obj in objs[1:]]
+
+        tiles = {}
+        for tile_size in tile_sizes:
+            array = np.zeros((len(objs), 2, tile_size, tile_size, 3), dtype=np.uint8)
+            for k, obj in enumerate(objs):
+                for highlight in [False, True]:
+                    array[k, int(highlight)] = BabaIsYouGrid.draw_tile(obj, highlight, tile_size, subdivs)
+            tiles[tile_size] = array
+        return cls(keys, tiles, subdivs)
+
+    @staticmethod
+    def key(obj):
+        """
+        Names of the (type, color, dir, flags) record of an object
+        """
+        type_idx, color_idx, direction, flags = (int(x) for x in pack_obj(obj))
+        # IDX_TO_OBJECT and IDX_TO_COLOR don't contain the types and colors added by the BabaIsYou objects
+        type = {idx: name for name, idx in OBJECT_TO_IDX.items()}[type_idx]
+        color = {idx: name for name, idx in COLOR_TO_IDX.items()}[color_idx]
+        return type, color, direction if type in DIRECTIONAL_TYPES else 0, flags
+
+    def index(self, obj):
+        """
+        Index of the tile of an object in the atlas, -1 if the atlas doesn't contain the tile
+        """
+        if obj is None:
+            return self.index_of.get((OBJECT_TO_IDX["empty"], 0, 0, 0), -1)
+        type_idx, color_idx, direction, flags = pack_obj(obj)
+        if type_idx not in self.directional:
+            direction = 0
+        return self.index_of.get((type_idx, color_idx, direction, flags), -1)
+
+    def get_tile(self, obj, highlight=False, tile_size=TILE_PIXELS):
+        """
+        Tile of an object, None if the atlas doesn't contain the tile
+        """
+        if tile_size not in self.tiles:
+            return None
+        k = self.index(obj)
+        if k < 0:
+            return None
+        return self.tiles[tile_size][k, int(highlight)]
+
+    def save(self, path):
+        """
+        Save the atlas in a file made of the length of a json header, the header and the raw arrays of tiles
+        """
+        offsets = {}
+        offset = 0
+        for tile_size in self.tile_sizes:
+            offsets[str(tile_size)] = offset
+            offset += self.tiles[tile_size].nbytes
+        header = json.dumps({"keys": self.keys, "subdivs": self.subdivs, "offsets": offsets}).encode()
+
+        with open(path, "wb") as f:
+            f.write(len(header).to_bytes(HEADER_LENGTH_SIZE, "little"))
+            f.write(header)
+            for tile_size in self.tile_sizes:
+                f.write(np.ascontiguousarray(self.tiles[tile_size], dtype=np.uint8).tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an atlas saved with save(), the tiles are memory-mapped in read-only mode
+        """
+        with open(path, "rb") as f:
+            header_length = int.from_bytes(f.read(HEADER_LENGTH_SIZE), "little")
+            header = json.loads(f.read(header_length).decode())
+
+        start = HEADER_LENGTH_SIZE + header_length
+        n_tiles = len(header["keys"])
+        tiles = {}
+        for tile_size, offset in header["offsets"].items():
+            tile_size = int(tile_size)
+            tiles[tile_size] = np.memmap(path, dtype=np.uint8, mode="r", offset=start + offset,
+                                         shape=(n_tiles, 2, tile_size, tile_size, 3))
+        return cls(header["keys"], tiles, header["subdivs"])
+
+
+def use_atlas(atlas):
+    """
+    Render the tiles of the BabaIsYou grids with an atlas (or a path to an atlas file), None to stop using an atlas
+    """
+    if isinstance(atlas, str):
+        atlas = TileAtlas.load(atlas)
+    BabaIsYouGrid.atlas = atlas
+    return atlas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an atlas of the tiles of the BabaIsYou grids")
+    parser.add_argument("path", help="path of the atlas file")
+    parser.add_argument("--tile-sizes", type=int, nargs="+", default=[TILE_PIXELS], help="sizes of the tiles")
+    parser.add_argument("--subdivs", type=int, default=3, help="subdivisions of the tiles for anti-aliasing")
+    args = parser.parse_args()
+
+    atlas = TileAtlas.build(args.tile_sizes, args.subdivs)
+    atlas.save(args.path)
+    print("saved {} tiles of sizes {} in {}".format(len(atlas.keys), atlas.tile_sizes, args.path))
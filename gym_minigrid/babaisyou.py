@@ -1,4 +1,6 @@
 import hashlib
+import heapq
+import itertools
 import math
 from abc import abstractmethod
 from enum import IntEnum
@@ -12,9 +14,11 @@ from gym.utils import seeding
 # Size in pixels of a tile in the full-scale human view
 from gym_minigrid.minigrid import Grid, TILE_PIXELS, DIR_TO_VEC, WorldObj, Wall, OBJECT_TO_IDX
 from gym_minigrid.rendering import (
+    TileCache,
     downsample,
     fill_coords,
     highlight_img,
+    highlight_img_int,
     point_in_circle,
     point_in_line,
     point_in_rect,
@@ -22,7 +26,87 @@ from gym_minigrid.rendering import (
     rotate_fn,
 )
 from gym_minigrid.window import Window
-from gym_minigrid.rule import extract_ruleset
+from gym_minigrid.rule import IncrementalRuleset, compile_ruleset, property_bit
+
+# Fields of the packed description of an object stored in BabaIsYouGrid.cells
+FIELD_TYPE = 0
+FIELD_COLOR = 1
+FIELD_DIR = 2
+FIELD_FLAGS = 3
+NUM_FIELDS = 4
+
+# Packed description of an empty stack level
+EMPTY_RECORD = (OBJECT_TO_IDX["empty"], 0, 0, 0)
+
+
+def pack_obj(obj):
+    """
+    Pack an object into a (type, color, dir, flags) record, the flags being the state returned by obj.encode()
+    """
+    type_idx, color_idx, state = obj.encode()
+    return type_idx, color_idx, getattr(obj, "dir", 0), state
+
+
+# Map of direction vectors to direction indices
+VEC_TO_DIR = {(int(v[0]), int(v[1])): d for d, v in enumerate(DIR_TO_VEC)}
+
+# Identifiers of the grids, a state saved from a grid can only be restored in the same grid
+_grid_ids = itertools.count(1)
+
+MASK64 = (1 << 64) - 1
+
+
+def zobrist_mix(x):
+    """
+    Map an integer to a pseudo-random 64-bit key (splitmix64 finalizer, a bijection on 64-bit integers)
+    """
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def zobrist_key(i, j, z, record):
+    """
+    Key of a packed record (as a uint32) at the stack level z of the cell (i, j) in the Zobrist hash of a grid
+    """
+    return zobrist_mix((i << 20 | j << 8 | z) << 32 | record)
+
+
+def zobrist_keys(i, j, z, records):
+    """
+    Keys of arrays of packed records (as uint32) at the stack levels z of the cells (i, j), like zobrist_key
+    """
+    x = (i.astype(np.uint64) << np.uint64(20) | j.astype(np.uint64) << np.uint64(8) | z.astype(np.uint64))
+    x = x << np.uint64(32) | records.astype(np.uint64)
+    # splitmix64 finalizer, the uint64 arithmetic wraps around like the masks of zobrist_mix
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def encode_stacks(depth, stacks, encoding_level, out=None):
+    """
+    Encode the encoding_level topmost objects of stacks of packed records
+    :param depth: number of objects in each stack, shape (...)
+    :param stacks: packed records, shape (..., max_stack, NUM_FIELDS)
+    :param out: uint8 array of shape (..., 3*encoding_level) in which the encoding is written, allocated if None
+    """
+    # stack level of the z-th object from the top, negative if there is no such object
+    levels = depth[..., None] - np.arange(1, encoding_level + 1)
+    empty = levels < 0
+
+    records = np.take_along_axis(stacks, np.where(empty, 0, levels)[..., None], axis=-2)
+    if out is None:
+        out = np.empty((*depth.shape, 3*encoding_level), dtype=np.uint8)
+    array = out.reshape(*depth.shape, encoding_level, 3)
+    array[..., 0] = records[..., FIELD_TYPE]
+    array[..., 1] = records[..., FIELD_COLOR]
+    array[..., 2] = records[..., FIELD_FLAGS]
+    array[empty] = (OBJECT_TO_IDX["empty"], 0, 0)
+    return out
+
 
 def rand_int(low, high):
     """
@@ -37,19 +121,51 @@ class BabaIsYouGrid:
     Represent a grid and operations on it
     """
 
-    # Static cache of pre-renderer tiles
-    tile_cache = {}
+    # Static cache of pre-rendered tiles, bounded by the number of bytes of the tiles
+    tile_cache = TileCache()
 
-    def __init__(self, width, height):
+    # Atlas of pre-rendered tiles (see gym_minigrid.atlas), looked up before rendering a tile
+    atlas = None
+
+    def __init__(self, width, height, max_stack=4):
         assert width >= 3
         assert height >= 3
+        assert max_stack >= 1
 
         self.width = width
         self.height = height
 
+        # Number of objects to encode for each cell
+        self.encoding_level = 1
+
         # self.grid = [[None]] * width * height  # self.grid[0].append(...) modifies all the elements and not just the first one
         self.grid = [[None] for _ in range(width * height)]
 
+        # Packed (type, color, dir, flags) records of the stacked objects, bottom first, kept in sync with self.grid.
+        # The capacity along the stack axis grows when a cell holds more than max_stack objects.
+        self.cells = np.empty((height, width, max_stack, NUM_FIELDS), dtype=np.uint8)
+        self.cells[:] = EMPTY_RECORD
+        # Number of objects stacked in each cell
+        self.depth = np.zeros((height, width), dtype=np.int32)
+
+        # Positions of the objects of each type, as a dict mapping (i, j) to the number of objects of the type in the cell
+        self.type_index = {}
+
+        # Sets recording the (i, j) positions of the cells modified by set/refresh, one per registered consumer
+        self._change_trackers = []
+
+        # All the objects that have been put in the grid, the saved states refer to the objects by their index + 1
+        self.objects = []
+        self._object_slots = {}
+        # Index + 1 in self.objects of the stacked objects, 0 for an empty stack level, kept in sync with self.cells
+        self.slots = np.zeros((height, width, max_stack), dtype=np.int32)
+        self._grid_id = next(_grid_ids)
+
+        # 64-bit Zobrist hash of the stacked objects, xor of the zobrist_key of every packed record
+        self.zobrist = 0
+        # packed records viewed as uint32, shape (height, width, max_stack)
+        self._records = self.cells.view(np.uint32)[..., 0]
+
     def __eq__(self, other):
         grid1 = self.encode()
         grid2 = other.encode()
@@ -61,7 +177,33 @@ class BabaIsYouGrid:
     def copy(self):
         from copy import deepcopy
 
-        return deepcopy(self)
+        grid = deepcopy(self)
+        # the consumers tracking the changes of this grid don't follow the copy
+        grid._change_trackers = []
+        grid._object_slots = {id(v): k + 1 for k, v in enumerate(grid.objects)}
+        grid._records = grid.cells.view(np.uint32)[..., 0]
+        grid._grid_id = next(_grid_ids)
+        return grid
+
+    def track_changes(self):
+        """
+        Return a set in which the position of every cell modified from now on is recorded. The consumer is
+        responsible for clearing the set once it has processed the changes.
+        """
+        tracker = set()
+        self._change_trackers.append(tracker)
+        return tracker
+
+    def untrack_changes(self, tracker):
+        self._change_trackers = [t for t in self._change_trackers if t is not tracker]
+
+    def _mark_changed(self, i, j):
+        for tracker in self._change_trackers:
+            tracker.add((i, j))
+
+    @property
+    def max_stack(self):
+        return self.cells.shape[2]
 
     def set(self, i, j, v):
         assert i >= 0 and i < self.width
@@ -73,10 +215,108 @@ class BabaIsYouGrid:
                 self.grid[idx] = [None]
             else:
                 # remove the obj at the top
-                self.grid[idx].pop()
+                v = self.grid[idx].pop()
+                self._unindex(v, i, j)
+                depth = int(self.depth[j, i]) - 1
+                self.depth[j, i] = depth
+                self.zobrist ^= zobrist_key(int(i), int(j), depth, int(self._records[j, i, depth]))
+                self.cells[j, i, depth] = EMPTY_RECORD
+                self.slots[j, i, depth] = 0
+                self._mark_changed(i, j)
         else:
             # stack objects
             self.grid[idx].append(v)
+            positions = self.type_index.setdefault(v.type, {})
+            positions[(i, j)] = positions.get((i, j), 0) + 1
+            depth = int(self.depth[j, i])
+            if depth == self.max_stack:
+                self._grow_stack()
+            self.cells[j, i, depth] = pack_obj(v)
+            slot = self._object_slots.get(id(v))
+            if slot is None:
+                self.objects.append(v)
+                slot = self._object_slots[id(v)] = len(self.objects)
+            self.slots[j, i, depth] = slot
+            self.depth[j, i] = depth + 1
+            self.zobrist ^= zobrist_key(int(i), int(j), depth, int(self._records[j, i, depth]))
+            self._mark_changed(i, j)
+
+    def _unindex(self, v, i, j):
+        positions = self.type_index[v.type]
+        if positions[(i, j)] == 1:
+            del positions[(i, j)]
+        else:
+            positions[(i, j)] -= 1
+
+    def positions_of(self, types):
+        """
+        Return the (i, j) positions of the cells containing an object of one of the given types
+        """
+        return {pos for t in types for pos in self.type_index.get(t, ())}
+
+    def refresh(self, i, j):
+        """
+        Update the packed record of the object at the top of a cell after it was modified in place (e.g. its dir)
+        """
+        z = int(self.depth[j, i]) - 1
+        if z >= 0:
+            record = int(self._records[j, i, z])
+            self.cells[j, i, z] = pack_obj(self.grid[j * self.width + i][-1])
+            new_record = int(self._records[j, i, z])
+            if new_record != record:
+                self.zobrist ^= zobrist_key(int(i), int(j), z, record) ^ zobrist_key(int(i), int(j), z, new_record)
+                self._mark_changed(i, j)
+
+    def _grow_stack(self):
+        """
+        Double the capacity of the packed cells along the stack axis
+        """
+        cells = np.empty((self.height, self.width, 2 * self.max_stack, NUM_FIELDS), dtype=np.uint8)
+        cells[:] = EMPTY_RECORD
+        cells[:, :, :self.max_stack] = self.cells
+        slots = np.zeros((self.height, self.width, 2 * self.max_stack), dtype=np.int32)
+        slots[:, :, :self.max_stack] = self.slots
+        self.cells = cells
+        self.slots = slots
+        self._records = self.cells.view(np.uint32)[..., 0]
+
+    def get_state(self):
+        """
+        Save the content of the grid (the stacked objects and their dir) in a bytes object
+        """
+        header = np.array([self._grid_id, self.max_stack], dtype=np.int64)
+        return header.tobytes() + self.slots.tobytes() + self.cells[..., FIELD_DIR].tobytes()
+
+    def set_state(self, state):
+        """
+        Restore the content of the grid saved by get_state. Only the cells that differ from the saved state are
+        modified, they are recorded as changed like with set.
+        """
+        grid_id, max_stack = np.frombuffer(state, dtype=np.int64, count=2)
+        assert grid_id == self._grid_id, "the state was saved from another grid"
+        while self.max_stack < max_stack:
+            self._grow_stack()
+
+        shape = (self.height, self.width, int(max_stack))
+        size = int(np.prod(shape))
+        slots = np.frombuffer(state, dtype=np.int32, count=size, offset=16).reshape(shape)
+        dirs = np.frombuffer(state, dtype=np.uint8, count=size, offset=16 + 4*size).reshape(shape)
+
+        changed = ((self.slots[:, :, :max_stack] != slots) | (self.cells[:, :, :max_stack, FIELD_DIR] != dirs)).any(-1)
+        changed |= self.depth > max_stack
+        changed = np.transpose(np.nonzero(changed)).tolist()
+
+        for j, i in changed:
+            while self.depth[j, i] > 0:
+                self.set(i, j, None)
+        for j, i in changed:
+            for slot, d in zip(slots[j, i].tolist(), dirs[j, i].tolist()):
+                if slot == 0:
+                    break
+                v = self.objects[slot - 1]
+                if hasattr(v, "dir"):
+                    v.dir = d
+                self.set(i, j, v)
 
     def get(self, i, j, z=-1):
         """
@@ -129,16 +369,36 @@ class BabaIsYouGrid:
         cls, obj, agent_dir=None, highlight=False, tile_size=TILE_PIXELS, subdivs=3
     ):
         """
-        Render a tile and cache the result
+        Render a tile and cache the result, the tile is taken from the atlas if one is loaded and contains the tile
+        :param agent_dir: unused, the agent is drawn as the object it controls
         """
+        if cls.atlas is not None and subdivs == cls.atlas.subdivs:
+            tile = cls.atlas.get_tile(obj, highlight, tile_size)
+            if tile is not None:
+                return tile
+
+        # Hash map lookup key for the cache, the packed record of the object includes its direction
+        key = (bool(highlight), tile_size, subdivs)
+        key = tuple(int(x) for x in pack_obj(obj)) + key if obj else key
 
-        # Hash map lookup key for the cache
-        key = (agent_dir, highlight, tile_size)
-        key = obj.encode() + key if obj else key
+        img = cls.tile_cache.get(key)
+        if img is not None:
+            return img
+
+        img = cls.draw_tile(obj, highlight=highlight, tile_size=tile_size, subdivs=subdivs).astype(np.uint8, copy=False)
 
-        if key in cls.tile_cache:
-            return cls.tile_cache[key]
+        # Cache the rendered tile
+        cls.tile_cache.put(key, img)
+
+        return img
 
+    @staticmethod
+    def draw_tile(obj, highlight=False, tile_size=TILE_PIXELS, subdivs=3):
+        """
+        Render a tile without caching
+        :param subdivs: number of subdivisions of the pixels used for anti-aliasing, the tile is rendered without
+            anti-aliasing and with integer operations only if 1
+        """
         img = np.zeros(
             shape=(tile_size * subdivs, tile_size * subdivs, 3), dtype=np.uint8
         )
@@ -164,76 +424,139 @@ class BabaIsYouGrid:
 
         # Highlight the cell if needed
         if highlight:
-            highlight_img(img)
+            if subdivs == 1:
+                highlight_img_int(img)
+            else:
+                highlight_img(img)
 
         # Downsample the image to perform supersampling/anti-aliasing
-        img = downsample(img, subdivs)
-
-        # Cache the rendered tile
-        cls.tile_cache[key] = img
+        if subdivs > 1:
+            img = downsample(img, subdivs)
 
         return img
 
-    def render(self, tile_size, agent_pos=None, agent_dir=None, highlight_mask=None):
+    def render(self, tile_size, agent_pos=None, agent_dir=None, highlight_mask=None, subdivs=3):
         """
         Render this grid at a given scale
-        :param r: target renderer object
         :param tile_size: tile size in pixels
+        :param highlight_mask: (width, height) boolean mask of the highlighted cells
+        :param subdivs: number of subdivisions of the pixels used for anti-aliasing, 1 to disable anti-aliasing
         """
+        tiles, (indices, highlight) = self.render_tiles(tile_size, highlight_mask, subdivs)
 
-        if highlight_mask is None:
-            highlight_mask = np.zeros(shape=(self.width, self.height), dtype=bool)
-
-        # Compute the total grid size
-        width_px = self.width * tile_size
-        height_px = self.height * tile_size
-
-        img = np.zeros(shape=(height_px, width_px, 3), dtype=np.uint8)
-
-        # Render the grid
-        for j in range(0, self.height):
-            for i in range(0, self.width):
-                cell = self.get(i, j)
-
-                agent_here = np.array_equal(agent_pos, (i, j))
-                tile_img = BabaIsYouGrid.render_tile(
-                    cell,
-                    agent_dir=agent_dir if agent_here else None,
-                    highlight=highlight_mask[i, j],
-                    tile_size=tile_size,
-                )
+        # gather the rows of the tiles of the cells in a (height, tile_size, width, tile_size, 3) array, which has the
+        # memory layout of the (height_px, width_px, 3) image
+        rows = np.arange(tile_size)[None, :, None]
+        img = tiles[indices[:, None, :], highlight[:, None, :], rows]
+        return img.reshape(self.height * tile_size, self.width * tile_size, 3)
 
-                ymin = j * tile_size
-                ymax = (j + 1) * tile_size
-                xmin = i * tile_size
-                xmax = (i + 1) * tile_size
-                img[ymin:ymax, xmin:xmax, :] = tile_img
+    def top_records(self):
+        """
+        Packed record and slot of the object at the top of each cell, 0 for the empty cells
+        :return: two (height, width) arrays
+        """
+        top = np.maximum(self.depth - 1, 0)[..., None]
+        records = np.take_along_axis(self._records, top, axis=2)[..., 0]
+        slots = np.take_along_axis(self.slots, top, axis=2)[..., 0]
+        return np.where(self.depth > 0, records, 0), np.where(self.depth > 0, slots, 0)
 
-        return img
+    def render_cells(self, img, cells, tile_size, subdivs=3):
+        """
+        Render again the tiles of some cells in a frame rendered without highlight by render()
+        :param cells: (i, j) positions of the cells
+        """
+        for i, j in cells:
+            img[j * tile_size:(j + 1) * tile_size, i * tile_size:(i + 1) * tile_size] = BabaIsYouGrid.render_tile(
+                self.get(i, j), tile_size=tile_size, subdivs=subdivs)
 
-    def encode(self, vis_mask=None):
+    def render_tiles(self, tile_size, highlight_mask=None, subdivs=3):
         """
-        Produce a compact numpy encoding of the grid
+        Render the tiles of the objects at the top of the cells
+        :return: the (n_tiles, 2, tile_size, tile_size, 3) array of the tiles without and with highlight, and the
+            (indices, highlight) pair of (height, width) arrays indexing the tile of each cell in this array
         """
+        records, slots = self.top_records()
+
+        # render the tile of each distinct record from one of its objects
+        unique, first, inverse = np.unique(records, return_index=True, return_inverse=True)
+        slots = slots.ravel()[first]
+        tiles = np.zeros((len(unique), 2, tile_size, tile_size, 3), dtype=np.uint8)
+        highlights = [False] if highlight_mask is None else [False, True]
+        for k, slot in enumerate(slots):
+            obj = self.objects[slot - 1] if slot > 0 else None
+            for highlight in highlights:
+                tiles[k, int(highlight)] = BabaIsYouGrid.render_tile(obj, highlight=highlight, tile_size=tile_size,
+                                                                     subdivs=subdivs)
 
-        if vis_mask is None:
-            vis_mask = np.ones((self.width, self.height), dtype=bool)
+        if highlight_mask is None:
+            highlight = np.zeros((self.height, self.width), dtype=np.intp)
+        else:
+            highlight = np.asarray(highlight_mask, dtype=np.intp).T
+        return tiles, (inverse.reshape(self.height, self.width), highlight)
 
-        array = np.zeros((self.width, self.height, 3*self.encoding_level), dtype="uint8")
+    def encode(self, vis_mask=None, out=None):
+        """
+        Produce a compact numpy encoding of the grid, with the encoding_level topmost objects of each cell
+        :param out: (width, height, 3*encoding_level) uint8 array in which the encoding is written, allocated if None
+        """
+        array = encode_stacks(self.depth.T, self.cells.transpose(1, 0, 2, 3), self.encoding_level, out)
 
-        def _encode_cell_objects(i, j):
-            v_arr = np.zeros(3*self.encoding_level)
-            for idx, z in enumerate(range(1, self.encoding_level+1)):
-                v = self.get(i, j, -z)
-                v_arr[idx*3:(idx+1)*3] = self.encode_cell(v)
-            return v_arr
+        if vis_mask is not None:
+            array[~vis_mask] = 0
+        return array
 
-        for i in range(self.width):
-            for j in range(self.height):
-                if vis_mask[i, j]:
-                    array[i, j] = _encode_cell_objects(i, j)
+    def encode_cells(self, array, positions):
+        """
+        Update the encoding of the cells at the given (i, j) positions in an array produced by encode
+        """
+        if len(positions) == 0:
+            return array
+        i, j = np.array(list(positions)).T
+        array[i, j] = encode_stacks(self.depth[j, i], self.cells[j, i], self.encoding_level)
         return array
 
+    def bind(self, cells, depth, slots=None):
+        """
+        Store the packed cells and the depth of the grid in the given arrays (e.g. slices of the arrays of a batch of
+        grids) instead of arrays owned by the grid. The grid switches back to its own arrays if its stacks grow
+        beyond the capacity of the given cells.
+        :param cells: array of shape (height, width, capacity, NUM_FIELDS), capacity >= max depth of the grid
+        :param depth: array of shape (height, width)
+        :param slots: int32 array of shape (height, width, capacity) in which the slots are stored, allocated if None
+        """
+        assert cells.shape[2] >= self.depth.max()
+        n = min(cells.shape[2], self.max_stack)
+        cells[:] = EMPTY_RECORD
+        cells[:, :, :n] = self.cells[:, :, :n]
+        depth[:] = self.depth
+        if slots is None:
+            slots = np.zeros(cells.shape[:3], dtype=np.int32)
+        slots[:] = 0
+        slots[:, :, :n] = self.slots[:, :, :n]
+
+        self.cells = cells
+        self.depth = depth
+        self.slots = slots
+        self._records = self.cells.view(np.uint32)[..., 0]
+
+    def sync_move(self, i, j, new_i, new_j, direction):
+        """
+        Update the objects of the grid after the packed record and the slot of the object at the top of (i, j) were
+        moved to the top of (new_i, new_j) with the given direction in the arrays of the grid (see
+        BabaIsYouVecEngine). The object is only turned if (new_i, new_j) is (i, j). The Zobrist hash is left to the
+        caller.
+        """
+        v = self.grid[j * self.width + i][-1]
+        v.dir = direction
+        if (new_i, new_j) != (i, j):
+            self.grid[j * self.width + i].pop()
+            self.grid[new_j * self.width + new_i].append(v)
+            self._unindex(v, i, j)
+            positions = self.type_index[v.type]
+            positions[(new_i, new_j)] = positions.get((new_i, new_j), 0) + 1
+            self._mark_changed(new_i, new_j)
+        self._mark_changed(i, j)
+
     def encode_cell(self, v):
         if v is None:
             return np.array([OBJECT_TO_IDX["empty"], 0, 0])
@@ -301,6 +624,54 @@ class BabaIsYouGrid:
         return mask
 
 
+def render_grids(grids, tile_size=TILE_PIXELS, out=None, subdivs=3):
+    """
+    Render a batch of grids of the same size into a single array of frames
+    :param grids: BabaIsYouGrid of the same width and height
+    :param out: (len(grids), height_px, width_px, 3) uint8 C-contiguous array in which the frames are written, a new
+        array is allocated if None
+    :param subdivs: number of subdivisions of the pixels used for anti-aliasing, 1 to disable anti-aliasing
+    """
+    height, width = grids[0].height, grids[0].width
+    shape = (len(grids), height * tile_size, width * tile_size, 3)
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    assert out.shape == shape and out.dtype == np.uint8 and out.flags.c_contiguous
+
+    records, slots = zip(*(grid.top_records() for grid in grids))
+    records, slots = np.stack(records), np.stack(slots)
+
+    # render the tile of each distinct record in the batch from one of its objects
+    unique, first, inverse = np.unique(records, return_index=True, return_inverse=True)
+    tiles = np.empty((len(unique), tile_size, tile_size, 3), dtype=np.uint8)
+    for k, index in enumerate(first):
+        slot = slots.flat[index]
+        obj = grids[index // (height * width)].objects[slot - 1] if slot > 0 else None
+        tiles[k] = BabaIsYouGrid.render_tile(obj, tile_size=tile_size, subdivs=subdivs)
+
+    return gather_tiles(tiles, inverse.reshape(len(grids), height, width), out)
+
+
+def gather_tiles(tiles, indices, out=None):
+    """
+    Assemble images from tiles
+    :param tiles: (n_tiles, tile_size, tile_size, 3) array of tiles
+    :param indices: (..., height, width) array of the indices of the tiles of the cells
+    :param out: (..., height_px, width_px, 3) uint8 C-contiguous array in which the images are written, a new array
+        is allocated if None
+    """
+    tile_size = tiles.shape[1]
+    *batch, height, width = indices.shape
+    if out is None:
+        out = np.empty((*batch, height * tile_size, width * tile_size, 3), dtype=np.uint8)
+
+    # the images are gathered row by row from the tiles, the index of a row of a tile is (tile, row in the tile)
+    rows = indices[..., None, :] * tile_size + np.arange(tile_size)[:, None]
+    np.take(tiles.reshape(-1, tile_size * 3), rows, axis=0,
+            out=out.reshape(*batch, height, tile_size, width, tile_size * 3))
+    return out
+
+
 class BabaIsYouEnv(gym.Env):
     metadata = {
         # Deprecated: use 'render_modes' instead
@@ -318,6 +689,9 @@ class BabaIsYouEnv(gym.Env):
         down = 3
         left = 4
 
+    # Direction of the agent after each movement action
+    ACTION_TO_DIR = {Actions.right: 0, Actions.down: 1, Actions.left: 2, Actions.up: 3}
+
     def __init__(
         self,
         grid_size: int = None,
@@ -335,6 +709,25 @@ class BabaIsYouEnv(gym.Env):
         # Number of objects to encode for each cell
         self.encoding_level = kwargs.get('encoding_level', 1)
 
+        # The observation is patched in place for the cells changed since the last step, set copy_obs to return a
+        # fresh array instead
+        self.copy_obs = kwargs.get('copy_obs', False)
+        self._obs = None
+        self._obs_grid = None
+        self._obs_changes = None
+        # Array owned by the caller in which the observations are written (see set_obs_buffer)
+        self._obs_buffer = None
+
+        # The frame rendered by render() is updated in place for the cells changed since the last render, set
+        # copy_frame to False to get this frame instead of a copy in rgb_array mode
+        self.copy_frame = kwargs.get('copy_frame', True)
+        self._frame = None
+        self._frame_grid = None
+        self._frame_changes = None
+        self._frame_subdivs = None
+        # Set antialias to False to render the tiles without supersampling, which is faster for small tiles
+        self.render_subdivs = 3 if kwargs.get('antialias', True) else 1
+
         # Action enumeration for this environment
         self.actions = BabaIsYouEnv.Actions
 
@@ -351,6 +744,9 @@ class BabaIsYouEnv(gym.Env):
         # Range of possible rewards
         self.reward_range = (0, 1)
 
+        if kwargs.get('obs_buffer') is not None:
+            self.set_obs_buffer(kwargs['obs_buffer'])
+
         self.window: Window = None
 
         # Environment configuration
@@ -366,6 +762,8 @@ class BabaIsYouEnv(gym.Env):
         # Initialize the env
         self.grid = None
         self._ruleset = {}
+        # ruleset compiled into property bitmasks per object type, shared with the objects of the grid
+        self._rule_masks = {}
         self.default_ruleset = kwargs.get('default_ruleset', {})
 
         self.reset()
@@ -373,6 +771,13 @@ class BabaIsYouEnv(gym.Env):
     def get_ruleset(self):
         return self._ruleset
 
+    @property
+    def ruleset_version(self):
+        """
+        Number of changes of the ruleset since the start of the episode
+        """
+        return self._rule_tracker.version
+
     def reset(self, *, seed=None, return_info=False, options=None):
         super().reset(seed=seed)
         # Current position and direction of the agent
@@ -385,8 +790,10 @@ class BabaIsYouEnv(gym.Env):
         # Set the encoding level for the grid
         self.grid.encoding_level = self.encoding_level
 
-        # Compute the ruleset for the generated grid
-        self._ruleset = extract_ruleset(self.grid, default_ruleset=self.default_ruleset)
+        # Compute the ruleset for the generated grid, it is then updated incrementally at each step
+        self._rule_tracker = IncrementalRuleset(self.grid, default_ruleset=self.default_ruleset)
+        self._ruleset = self._rule_tracker.ruleset
+        compile_ruleset(self._ruleset, self._rule_masks)
 
         # make the ruleset accessible to all FlexibleWorlObj (not working for objects added after reset is called)
         # for e in self.grid:
@@ -396,6 +803,7 @@ class BabaIsYouEnv(gym.Env):
             for e in e_list:
                 if hasattr(e, "set_ruleset_getter"):
                     e.set_ruleset_getter(self.get_ruleset)
+                    e.set_rule_masks(self._rule_masks)
 
         # These fields should be defined by _gen_grid
         assert self.agent_pos is not None
@@ -431,6 +839,37 @@ class BabaIsYouEnv(gym.Env):
 
         return sample_hash.hexdigest()[:size]
 
+    def zobrist_hash(self):
+        """
+        64-bit hash of the current state (all the stacked objects with their dir, agent position and direction),
+        maintained incrementally by the grid. Faster than hash but only stable within a process.
+        """
+        # the agent is hashed like an object at the stack level 255 of its cell
+        i, j = int(self.agent_pos[0]), int(self.agent_pos[1])
+        return self.grid.zobrist ^ zobrist_key(i, j, 255, int(self.agent_dir))
+
+    def get_state(self):
+        """
+        Save the state of the environment (grid, agent position and direction, step count) in a bytes object that
+        can be restored with set_state during the same episode
+        """
+        # the agent position is an array after reset and a tuple after a step
+        pos_is_array = isinstance(self.agent_pos, np.ndarray)
+        header = np.array([self.step_count, self.agent_pos[0], self.agent_pos[1], self.agent_dir, pos_is_array],
+                          dtype=np.int64)
+        return header.tobytes() + self.grid.get_state()
+
+    def set_state(self, state):
+        """
+        Restore a state saved by get_state. The ruleset is updated from the restored grid.
+        """
+        step_count, i, j, agent_dir, pos_is_array = np.frombuffer(state, dtype=np.int64, count=5).tolist()
+        self.grid.set_state(memoryview(state)[40:])
+        self.step_count = step_count
+        self.agent_pos = np.array((i, j)) if pos_is_array else (i, j)
+        self.agent_dir = agent_dir
+        self._update_ruleset()
+
     @property
     def steps_remaining(self):
         return self.max_steps - self.step_count
@@ -614,14 +1053,17 @@ class BabaIsYouEnv(gym.Env):
         """
         Change the position of an object in the grid
         """
-        if np.any(pos != new_pos):
+        i, j = int(pos[0]), int(pos[1])
+        new_i, new_j = int(new_pos[0]), int(new_pos[1])
+        if (i, j) != (new_i, new_j):
             # move the object
-            e = self.grid.get(*pos)
-            self.grid.set(*new_pos, e)
-            self.grid.set(*pos, None)
+            e = self.grid.get(i, j)
+            self.grid.set(new_i, new_j, e)
+            self.grid.set(i, j, None)
             # change the dir of the object
             if mvt_dir is not None:
-                e.dir = np.argwhere(np.all(DIR_TO_VEC == mvt_dir, axis=1))[0][0]
+                e.dir = VEC_TO_DIR[int(mvt_dir[0]), int(mvt_dir[1])]
+                self.grid.refresh(new_i, new_j)
 
     def is_win_pos(self, pos):
         new_cell = self.grid.get(*pos)
@@ -633,93 +1075,156 @@ class BabaIsYouEnv(gym.Env):
 
     def move(self, pos, dir_vec):
         """
-        Return fwd_pos if can move, otherwise return pos
+        Move the object at pos in the direction dir_vec, pushing the objects in front of it and pulling the objects
+        behind it. Return (new_pos, is_win, is_lose), new_pos is pos if the object can't move.
         """
         # TODO: win only if the agent is on a winning block? Win and lose rules apply only to the agent, not to the pushed objects
         # if the agent pushes an obj on a winning block, win the game but if it is a losing block, just destroy the obj
         # is_obj_win = False
+        dx, dy = int(dir_vec[0]), int(dir_vec[1])
+
+        # the recursive moves (push the object in front, move, pull the object behind) are run on an explicit stack
+        # of frames [i, j, step, result, n_moves when the frame was entered]
+        stack = []
+        # a move of the same object with no object moved since an enclosing move of it would repeat forever, it is
+        # skipped (e.g. an object that is both pushed and pulled by an object that can't move)
+        active = set()
+        n_moves = 0
+
+        def enter(i, j):
+            if (i, j, n_moves) not in active:
+                active.add((i, j, n_moves))
+                stack.append([i, j, 0, None, n_moves])
+
+        enter(int(pos[0]), int(pos[1]))
+        while True:
+            frame = stack[-1]
+            i, j = frame[0], frame[1]
+            fi, fj = i + dx, j + dy
+
+            if frame[2] == 0:
+                # if fwd_cell can be pushed, try to move it
+                frame[2] = 1
+                fwd_cell = self.grid.get(fi, fj) if self._inside(fi, fj) else None
+                if fwd_cell is not None and fwd_cell.can_push():
+                    enter(fi, fj)
+                    continue
 
-        fwd_pos = pos + dir_vec
-        # if fwd_cell can be pushed, try to move it
-        fwd_cell = self.grid.get(*fwd_pos)
-
-        if fwd_cell is not None and fwd_cell.can_push():
-            # new_fwd_pos, is_obj_win, is_obj_lose = self.move(fwd_pos, dir_vec)
-            new_fwd_pos, _, _ = self.move(fwd_pos, dir_vec)
-            # TODO: hot and melt rules
-            # if is_obj_lose:
-            #     self.grid.set(*fwd_pos, None)  # destroy the obj
-            # else:
-            # self.change_obj_pos(fwd_pos, new_fwd_pos)  # move the obj
-
-        # move if the fwd cell is empty or can overlap
-        fwd_cell = self.grid.get(*fwd_pos)
-        if fwd_cell is None or fwd_cell.can_overlap():
-            new_pos = tuple(fwd_pos)
-        else:
-            new_pos = pos
+            if frame[2] == 1:
+                frame[2] = 2
+                # move if the fwd cell is empty or can overlap
+                if self._inside(fi, fj):
+                    fwd_cell = self.grid.get(fi, fj)
+                    new_pos = (fi, fj) if fwd_cell is None or fwd_cell.can_overlap() else (i, j)
+                else:
+                    new_pos = (i, j)
+                # check if win or lose before moving the object
+                frame[3] = (new_pos, self.is_win_pos(new_pos), self.is_lose_pos(new_pos))
+                if new_pos != (i, j):
+                    self.change_obj_pos((i, j), new_pos, (dx, dy))
+                    n_moves += 1
+
+                # pull object in the cell behind
+                bi, bj = i - dx, j - dy
+                bwd_cell = self.grid.get(bi, bj) if self._inside(bi, bj) else None
+                if bwd_cell is not None and bwd_cell.is_pull():
+                    enter(bi, bj)
+                    continue
 
-        # TODO: move the agent here or just compute the mvts and execute them later?
-        # check if win or lose before moving the agent
-        is_win = self.is_win_pos(new_pos)
-        is_lose = self.is_lose_pos(new_pos)
-        self.change_obj_pos(pos, new_pos, dir_vec)
+            stack.pop()
+            active.discard((i, j, frame[4]))
+            if not stack:
+                return frame[3]
 
-        # pull object in the cell behind
-        bwd_pos = pos - dir_vec
-        bwd_cell = self.grid.get(*bwd_pos)
-        # the obj can be pulled if the agent has moved (i.e. new_pos = fwd_pos)
-        if bwd_cell is not None and bwd_cell.is_pull():
-            new_bwd_pos, _, _ = self.move(bwd_pos, dir_vec)
-            # self.change_obj_pos(bwd_pos, new_bwd_pos)
+    def _inside(self, i, j):
+        return 0 <= i < self.grid.width and 0 <= j < self.grid.height
 
-        return new_pos, is_win, is_lose
+    def rule_types(self, property):
+        """
+        Return the set of object types that have the given property in the current ruleset
+        """
+        bit = property_bit(property)
+        return {t for t, mask in self._rule_masks.items() if mask & bit}
+
+    def scan_objects(self, types):
+        """
+        Iterate over the cells whose top object has one of the given types, in row-major order like iterating over
+        the grid. The grid can be modified during the iteration: an object moved to a cell that has not been reached
+        yet is visited again, an object moved to a cell that has already been visited isn't.
+        Yield the (i, j) position of the cell and its top object.
+        """
+        width = self.grid.width
+        changes = self.grid.track_changes()
+        indices = [j * width + i for i, j in self.grid.positions_of(types)]
+        heapq.heapify(indices)
+
+        k = -1
+        try:
+            while indices:
+                next_k = heapq.heappop(indices)
+                if next_k <= k:
+                    continue
+                k = next_k
+                pos = (k % width, k // width)
+                e = self.grid.get(*pos)
+                if e is not None and e.type in types:
+                    yield pos, e
+
+                # cells modified while processing the object
+                for i, j in changes:
+                    if j * width + i > k:
+                        heapq.heappush(indices, j * width + i)
+                changes.clear()
+        finally:
+            self.grid.untrack_changes(changes)
 
     def step(self, action):
+        reward, done = self.apply_action(action)
+        obs = self.gen_obs()
+
+        return obs, reward, done, {}
+
+    def apply_action(self, action):
+        """
+        Update the state of the env with an action like step, without generating the observation.
+        Return (reward, done).
+        """
         self.step_count += 1
 
         is_win, is_lose = False, False
         reward = 0
         done = False
 
-        if action == self.actions.up:
-            self.agent_dir = 3
-        elif action == self.actions.right:
-            self.agent_dir = 0
-        elif action == self.actions.down:
-            self.agent_dir = 1
-        elif action == self.actions.left:
-            self.agent_dir = 2
-
-        # Get the position in front of the agent
-        fwd_pos = self.front_pos
-        # Get the contents of the cell in front of the agent
-        fwd_cell = self.grid.get(*fwd_pos)
+        action = int(action)
+        self.agent_dir = self.ACTION_TO_DIR.get(action, self.agent_dir)
 
         if action != self.actions.idle:
             # move the agent if the forward cell is empty or can overlap or can be pushed
             # self.agent_pos, is_win, is_lose = self.move(self.agent_pos, self.dir_vec)
 
-            for k, e in enumerate(self.grid):
+            agent_types = self.rule_types('is_agent')
+            move_types = self.rule_types('is_move')
+
+            for pos in self.grid.positions_of(agent_types | move_types):
+                e = self.grid.get(*pos)
                 if e is not None and (e.is_agent() or e.is_move()):
                     e.has_moved = False
 
             # TODO: stack objects if both agent and another character are pushing objects on the same cell at the same time
             # movements = []
             # the agent moves first
-            for k, e in enumerate(self.grid):
-                if e is not None and e.is_agent() and not e.has_moved:
+            for pos, e in self.scan_objects(agent_types):
+                if e.is_agent() and not e.has_moved:
                     e.dir = self.agent_dir
-                    pos = (k % self.grid.width, k // self.grid.width)
+                    self.grid.refresh(*pos)
                     new_pos, is_win, is_lose = self.move(pos, self.dir_vec)
                     # movements.append((pos, new_pos))
                     e.has_moved = True
                     self.agent_pos = new_pos  # TODO: works when the agent is just one cell in the env
 
             # move other objects
-            for k, e in enumerate(self.grid):
-                if e is not None and e.is_move() and not e.has_moved:
-                    pos = (k % self.grid.width, k // self.grid.width)
+            for pos, e in self.scan_objects(move_types):
+                if e.is_move() and not e.has_moved:
                     new_pos, _, _ = self.move(pos, DIR_TO_VEC[e.dir])
                     e.has_moved = True
 
@@ -733,14 +1238,21 @@ class BabaIsYouEnv(gym.Env):
 
             reward, done = self.reward()
 
-            self._ruleset = extract_ruleset(self.grid, default_ruleset=self.default_ruleset)
+            self._update_ruleset()
 
         if self.step_count >= self.max_steps:
             done = True
 
-        obs = self.gen_obs()
+        return reward, done
 
-        return obs, reward, done, {}
+    def _update_ruleset(self):
+        """
+        Update the ruleset with the rules changed in the grid since the last update
+        """
+        ruleset_version = self._rule_tracker.version
+        self._ruleset = self._rule_tracker.update()
+        if self._rule_tracker.version != ruleset_version:
+            compile_ruleset(self._ruleset, self._rule_masks)
 
     def reward(self):
         if self.is_win:
@@ -754,8 +1266,33 @@ class BabaIsYouEnv(gym.Env):
             reward = 0
         return reward, done
 
+    def set_obs_buffer(self, out):
+        """
+        Write the observations in an array owned by the caller (e.g. an array in shared memory or the slice of a batch
+        of observations) instead of an array owned by the env, the observation returned by the env is then always this
+        array. The whole grid is encoded again in the array at the next observation.
+        :param out: uint8 array with the shape of the observation space, None to use an array owned by the env
+        """
+        if out is not None:
+            assert out.shape == self.observation_space.shape and out.dtype == np.uint8
+        self._obs_buffer = out
+        if self._obs_grid is not None:
+            self._obs_grid.untrack_changes(self._obs_changes)
+            self._obs_grid = None
+
     def gen_obs(self):
-        return self.grid.encode()
+        if self._obs_grid is not self.grid or self._obs.shape[-1] != 3*self.grid.encoding_level:
+            # new grid, encode it from scratch
+            self._obs_grid = self.grid
+            self._obs_changes = self.grid.track_changes()
+            self._obs = self.grid.encode(out=self._obs_buffer)
+        elif self._obs_changes:
+            self.grid.encode_cells(self._obs, self._obs_changes)
+        self._obs_changes.clear()
+
+        if self.copy_obs and self._obs_buffer is None:
+            return self._obs.copy()
+        return self._obs
 
     def get_obs_render(self, obs, tile_size=TILE_PIXELS // 2):
         """
@@ -783,18 +1320,29 @@ class BabaIsYouEnv(gym.Env):
             self.window = Window("gym_minigrid")
             self.window.show(block=False)
 
-        # Render the whole grid
-        img = self.grid.render(
-            tile_size,
-            self.agent_pos,
-            self.agent_dir
-        )
+        frame_shape = (self.grid.height * tile_size, self.grid.width * tile_size, 3)
+        if (self._frame_grid is not self.grid or self._frame.shape != frame_shape
+                or self._frame_subdivs != self.render_subdivs):
+            # new grid, tile size or anti-aliasing, render the whole grid
+            self._frame_grid = self.grid
+            self._frame_subdivs = self.render_subdivs
+            self._frame_changes = self.grid.track_changes()
+            self._frame = self.grid.render(
+                tile_size,
+                self.agent_pos,
+                self.agent_dir,
+                subdivs=self.render_subdivs,
+            )
+        elif self._frame_changes:
+            self.grid.render_cells(self._frame, self._frame_changes, tile_size, self.render_subdivs)
+        self._frame_changes.clear()
+        img = self._frame
 
         if mode == "human":
             # self.window.set_caption(self.mission)
             self.window.show_img(img)
         else:
-            return img
+            return img.copy() if self.copy_frame else img
 
     def close(self):
         if self.window:
@@ -1,10 +1,12 @@
 import math
 
+import cv2
 import numpy as np
 
 from gym_minigrid.envs.core.utils import add_img_text
 from gym_minigrid.minigrid import WorldObj, COLORS, OBJECT_TO_IDX, COLOR_TO_IDX
 from gym_minigrid.rendering import fill_coords, point_in_circle, point_in_rect, point_in_triangle, rotate_fn
+from gym_minigrid.rule import property_bit
 
 
 properties = [
@@ -86,18 +88,66 @@ def make_obj(name: str):
         raise ValueError(name)
 
 
+def decode_obj(type_idx, color_idx, direction=0, state=0):
+    """
+    Make an object from its packed (type, color, dir, state) description (see babaisyou.pack_obj)
+    """
+    type = {idx: name for name, idx in OBJECT_TO_IDX.items()}[type_idx]
+    color = {idx: name for name, idx in COLOR_TO_IDX.items()}[color_idx]
+
+    if type in ["rule_object", "rule_property", "rule_is"]:
+        # the color of a rule block is its displayed name
+        name = {displayed: name for name, displayed in name_mapping.items()}[color]
+        if type == "rule_object":
+            return RuleObject(name)
+        elif type == "rule_property":
+            return RuleProperty(name)
+        return RuleIs()
+    elif type in objects:
+        obj = {"fwall": FWall, "fball": FBall, "fdoor": FDoor, "fkey": FKey, "baba": Baba}[type](color)
+        obj.dir = direction
+        return obj
+    return WorldObj.decode(type_idx, color_idx, state)
+
+
+# Images of the labels of the rule blocks, shared by all the rule blocks
+_label_images = {}
+
+
+def label_image(name, size):
+    """
+    Image of the label of a rule block, drawn once for each name and size of label
+    """
+    key = (name, size)
+    img = _label_images.get(key)
+    if img is None:
+        base_size = 96 - 2*RuleBlock.margin
+        if size == base_size:
+            img = np.zeros((size, size, 3), np.uint8)
+            add_img_text(img, name)
+        else:
+            # scale the label drawn for a 96 pixels tile
+            img = cv2.resize(label_image(name, base_size), (size, size), interpolation=cv2.INTER_AREA)
+        img.flags.writeable = False
+        _label_images[key] = img
+    return img
+
+
 class RuleBlock(WorldObj):
     """
     By default, rule blocks can be pushed by the agent.
     """
+    # margin in pixels around the label in a 96 pixels tile
+    margin = 10
+
     def __init__(self, name, type, color, can_push=True):
         super().__init__(type, color)
         self._can_push = can_push
-        self.name = name = name_mapping.get(name, name)
-        self.margin = 10
-        img = np.zeros((96-2*self.margin, 96-2*self.margin, 3), np.uint8)
-        add_img_text(img, name)
-        self.img = img
+        self.name = name_mapping.get(name, name)
+
+    @property
+    def img(self):
+        return label_image(self.name, 96-2*self.margin)
 
     def can_overlap(self):
         return False
@@ -107,7 +157,9 @@ class RuleBlock(WorldObj):
 
     def render(self, img):
         fill_coords(img, point_in_rect(0.06, 0.94, 0.06, 0.94), [235, 235, 235])
-        img[self.margin:-self.margin, self.margin:-self.margin] = self.img
+        size = img.shape[0]
+        margin = self.margin if size == 96 else round(self.margin * size / 96)
+        img[margin:size-margin, margin:size-margin] = label_image(self.name, size - 2*margin)
 
     # TODO: different encodings of the rule blocks for the agent observation
     def encode(self):
@@ -135,32 +187,27 @@ class RuleIs(RuleBlock):
         super().__init__('is', 'rule_is', 'purple', can_push=can_push)
 
 
-def make_prop_fn(prop, typ):
+def make_prop_fn(prop):
     """
-    Make a method that retrieves the property of a FlexibleWorldObj in the ruleset
+    Make a method that tests the bit of a property in the compiled rule mask of the type of a FlexibleWorldObj
     """
-    def get_prop(self):
-        ruleset = self.get_ruleset()
+    bit = property_bit(prop)
 
-        # TODO: is_pull, is_agent implies is_stop
-        if prop == 'is_block':
-            if ruleset['is_pull'].get(typ, False) or ruleset['is_agent'].get(typ, False):
-                ruleset['is_block'][typ] = True
-
-        return ruleset[prop].get(typ, False)
+    def get_prop(self):
+        return self._rule_masks.get(self.type, 0) & bit != 0
     return get_prop
 
 
 class FlexibleWorldObj(WorldObj):
+    # rule masks compiled from the ruleset of the env (see rule.compile_ruleset), shared by all the objects of the env
+    _rule_masks = {}
+
     def __init__(self, type, color):
         assert type in objects, "{} not in {}".format(type, objects)
         super().__init__(type, color)
         # direction in which the object is facing
         self.dir = 0  # order: right, down, left, up
 
-        for prop in properties:
-            setattr(self.__class__, prop, make_prop_fn(prop, self.type))
-
     # TODO: might be better to use a Ruleset object
     def set_ruleset_getter(self, get_ruleset):
         self._get_ruleset = get_ruleset
@@ -168,11 +215,18 @@ class FlexibleWorldObj(WorldObj):
     def get_ruleset(self):
         return self._get_ruleset()
 
+    def set_rule_masks(self, rule_masks):
+        self._rule_masks = rule_masks
+
     # compatibility with WorldObj
     def can_overlap(self):
         return not self.is_block()
 
 
+for prop in properties:
+    setattr(FlexibleWorldObj, prop, make_prop_fn(prop))
+
+
 class FWall(FlexibleWorldObj):
     def __init__(self, color="grey"):
         super().__init__("fwall", color)
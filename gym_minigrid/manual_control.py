@@ -15,6 +15,8 @@ def redraw(img):
 
 
 def reset():
+    # the actions of the keys pressed before the reset don't apply to the new episode
+    pending_actions.clear()
     seed = None if args.seed == -1 else args.seed
     obs = env.reset(seed=seed)
 
@@ -26,14 +28,27 @@ def reset():
 
 
 def step(action):
-    obs, reward, done, info = env.step(action)
-    print(f"step={env.step_count}, reward={reward:.2f}")
+    # the action is applied at the next frame
+    pending_actions.append(action)
 
-    if done:
-        print("done!")
-        reset()
-    else:
-        redraw(obs)
+
+def update():
+    """
+    Apply the actions of the keys pressed since the last frame and redraw once
+    """
+    if not pending_actions:
+        return
+    obs = None
+    for action in pending_actions:
+        obs, reward, done, info = env.step(action)
+        print(f"step={env.step_count}, reward={reward:.2f}")
+
+        if done:
+            print("done!")
+            reset()
+            return
+    pending_actions.clear()
+    redraw(obs)
 
 
 def key_handler(event):
@@ -83,6 +98,9 @@ parser.add_argument(
 parser.add_argument(
     "--tile_size", type=int, help="size at which to render tiles", default=32
 )
+parser.add_argument(
+    "--fps", type=int, help="maximum number of redraws per second", default=60
+)
 parser.add_argument(
     "--agent_view",
     default=False,
@@ -98,8 +116,11 @@ if args.agent_view:
     env = RGBImgPartialObsWrapper(env)
     env = ImgObsWrapper(env)
 
+pending_actions = []
+
 window = Window("gym_minigrid - " + args.env)
 window.reg_key_handler(key_handler)
+window.reg_timer(update, fps=args.fps)
 
 reset()
 
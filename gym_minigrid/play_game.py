@@ -1,11 +1,12 @@
 import gymnasium as gym
+import numpy as np
 import pygame
 from gym_minigrid.babaisyou import BabaIsYouEnv #, BabaIsYouGrid
 from gym_minigrid.minigrid import MiniGridEnv #, Grid, MissionSpace,
 
 from gym_minigrid import register_minigrid_envs
 from gym.envs.registration import register
-from gym_minigrid.envs.babaisyou import TestRuleEnv
+from gym_minigrid.envs import TestRuleEnv
 
 from gym.utils.play import display_arr
 from pygame import VIDEORESIZE
@@ -32,10 +33,49 @@ def play_babaisyou(env):
         (ord('s'),): env.actions.down,
         (ord('q'),): env.actions.left
     }
-    play(env, fps=30, keys_to_action=keys_to_action)
+    play(env, fps=60, keys_to_action=keys_to_action)
+
+
+def scaled_indices(length, scaled_length):
+    """
+    Index of the pixel of a line shown at each pixel of the line scaled by pygame.transform.scale
+    """
+    line = np.zeros((length, 1, 3), dtype=np.uint8)
+    line[:, 0, 0] = np.arange(length) & 0xFF
+    line[:, 0, 1] = np.arange(length) >> 8
+    scaled = pygame.transform.scale(pygame.surfarray.make_surface(line), (scaled_length, 1))
+    scaled = pygame.surfarray.array3d(scaled)[:, 0].astype(np.intp)
+    return scaled[:, 0] | scaled[:, 1] << 8
 
 
-def play(env, transpose=True, fps=30, zoom=None, callback=None, keys_to_action=None):
+def display_frame(screen, frame, rows, cols):
+    """
+    Show a frame scaled to the screen like display_arr, without normalizing its values
+    :param rows, cols: rows and columns of the frame shown at each row and column of the screen (see scaled_indices)
+    """
+    screen.blit(pygame.surfarray.make_surface(frame[rows][:, cols].swapaxes(0, 1)), (0, 0))
+
+
+def display_cells(screen, frame, cells, tile_size, rows, cols):
+    """
+    Upload only the tiles of some cells of a frame shown with display_frame to the screen
+    :param cells: (i, j) positions of the cells
+    """
+    rects = []
+    for i, j in cells:
+        # pixels of the screen showing the tile
+        x0, x1 = np.searchsorted(cols, [i * tile_size, (i + 1) * tile_size])
+        y0, y1 = np.searchsorted(rows, [j * tile_size, (j + 1) * tile_size])
+        if x0 == x1 or y0 == y1:
+            # tile dropped by the downscaling
+            continue
+        tile = frame[rows[y0:y1]][:, cols[x0:x1]]
+        screen.blit(pygame.surfarray.make_surface(tile.swapaxes(0, 1)), (int(x0), int(y0)))
+        rects.append(pygame.Rect(int(x0), int(y0), int(x1 - x0), int(y1 - y0)))
+    pygame.display.update(rects)
+
+
+def play(env, transpose=True, fps=60, zoom=None, callback=None, keys_to_action=None):
     """Allows one to play the game using keyboard.
 
     To simply play the game use:
@@ -66,8 +106,10 @@ def play(env, transpose=True, fps=30, zoom=None, callback=None, keys_to_action=N
         If True the output of observation is transposed.
         Defaults to true.
     fps: int
-        Maximum number of steps of the environment to execute every second.
-        Defaults to 30.
+        Number of times the keyboard is polled every second, the screen is only
+        updated after a step of the environment, with the changed tiles only
+        for a BabaIsYouEnv.
+        Defaults to 60.
     zoom: float
         Make screen edge this many times bigger
     callback: lambda or None
@@ -115,50 +157,92 @@ def play(env, transpose=True, fps=30, zoom=None, callback=None, keys_to_action=N
     pressed_keys = []
     running = True
     env_done = True
+    redraw = True
+    tile_size, rows, cols = None, None, None
+
+    # the cells changed by the steps of a BabaIsYouEnv are redrawn, the other envs are redrawn entirely
+    base_env = env.unwrapped
+    track_changes = isinstance(base_env, BabaIsYouEnv) and transpose
+    grid, changes = None, None
+    if track_changes:
+        # the frame rendered by the env is only read before the next render, no need to copy it
+        copy_frame = base_env.copy_frame
+        base_env.copy_frame = False
 
     screen = pygame.display.set_mode(video_size)
     clock = pygame.time.Clock()
 
-    while running:
-        if env_done:
-            env_done = False
-            obs = env.reset()
-        else:
-            action = keys_to_action.get(tuple(sorted(pressed_keys)), None)  # TODO: was 0
-            pressed_keys = []
-            prev_obs = obs
-            if action is not None:
-                # obs, rew, env_done, _, info = env.step(action)
-                obs, rew, env_done, info = env.step(action)
-                print("Reward:", rew) if rew != 0 else None
-            if callback is not None:
-                callback(prev_obs, obs, action, rew, env_done, info)
-        if obs is not None:
-            # rendered = env.render()
-            rendered = env.render(mode="rgb_array")
-            display_arr(screen, rendered, transpose=transpose, video_size=video_size)
-
-        # process pygame events
-        for event in pygame.event.get():
-            # test events, set key states
-            if event.type == pygame.KEYDOWN:
-                if event.key in relevant_keys:
-                    pressed_keys.append(event.key)
-                elif event.key == 27:
+    try:
+        while running:
+            # process pygame events
+            for event in pygame.event.get():
+                # test events, set key states
+                if event.type == pygame.KEYDOWN:
+                    if event.key in relevant_keys:
+                        pressed_keys.append(event.key)
+                    elif event.key == 27:
+                        running = False
+                # elif event.type == pygame.KEYUP:
+                #     if event.key in relevant_keys:
+                #         pressed_keys.remove(event.key)
+                elif event.type == pygame.QUIT:
                     running = False
-            # elif event.type == pygame.KEYUP:
-            #     if event.key in relevant_keys:
-            #         pressed_keys.remove(event.key)
-            elif event.type == pygame.QUIT:
-                running = False
-            elif event.type == VIDEORESIZE:
-                video_size = event.size
-                screen = pygame.display.set_mode(video_size)
-                print(video_size)
-
-        pygame.display.flip()
-        clock.tick(fps)
-    pygame.quit()
+                elif event.type == VIDEORESIZE:
+                    video_size = event.size
+                    screen = pygame.display.set_mode(video_size)
+                    redraw = True
+                    print(video_size)
+
+            if env_done:
+                env_done = False
+                obs = env.reset()
+                redraw = True
+            elif pressed_keys:
+                action = keys_to_action.get(tuple(sorted(pressed_keys)), None)  # TODO: was 0
+                pressed_keys = []
+                prev_obs = obs
+                if action is not None:
+                    # obs, rew, env_done, _, info = env.step(action)
+                    obs, rew, env_done, info = env.step(action)
+                    print("Reward:", rew) if rew != 0 else None
+                    if callback is not None:
+                        callback(prev_obs, obs, action, rew, env_done, info)
+                    redraw = redraw or not track_changes
+
+            if track_changes and base_env.grid is not grid:
+                # new grid, track its changes
+                if grid is not None:
+                    grid.untrack_changes(changes)
+                grid = base_env.grid
+                changes = grid.track_changes()
+                redraw = True
+
+            if redraw or (changes and obs is not None):
+                # rendered = env.render()
+                rendered = env.render(mode="rgb_array")
+                if redraw and track_changes:
+                    # the tiles uploaded later are scaled with the same rows and columns
+                    tile_size = rendered.shape[0] // grid.height
+                    rows = scaled_indices(rendered.shape[0], video_size[1])
+                    cols = scaled_indices(rendered.shape[1], video_size[0])
+                    display_frame(screen, rendered, rows, cols)
+                    pygame.display.flip()
+                elif redraw:
+                    display_arr(screen, rendered, transpose=transpose, video_size=video_size)
+                    pygame.display.flip()
+                else:
+                    display_cells(screen, rendered, changes, tile_size, rows, cols)
+                if changes is not None:
+                    changes.clear()
+                redraw = False
+
+            clock.tick(fps)
+    finally:
+        if track_changes:
+            if grid is not None:
+                grid.untrack_changes(changes)
+            base_env.copy_frame = copy_frame
+        pygame.quit()
 
 
 # Uncomment to Play Test Cases from test_babaisyou.py
@@ -1,4 +1,5 @@
 import math
+from collections import OrderedDict
 
 import numpy as np
 
@@ -20,28 +21,45 @@ def downsample(img, factor):
     return img
 
 
-def fill_coords(img, fn, color):
+# Coordinates of the centers of the pixels of an image, cached by image shape
+_pixel_coords = {}
+
+
+def pixel_coords(height, width):
     """
-    Fill pixels of an image with coordinates matching a filter function
+    Return the x coordinates, shape (1, width), and y coordinates, shape (height, 1), of the centers of the pixels
+    of an image, normalized in [0, 1]
     """
+    key = (height, width)
+    if key not in _pixel_coords:
+        x = (np.arange(width) + 0.5) / width
+        y = (np.arange(height) + 0.5) / height
+        _pixel_coords[key] = (x[None, :], y[:, None])
+    return _pixel_coords[key]
 
-    for y in range(img.shape[0]):
-        for x in range(img.shape[1]):
-            yf = (y + 0.5) / img.shape[0]
-            xf = (x + 0.5) / img.shape[1]
-            if fn(xf, yf):
-                img[y, x] = color
+
+def fill_coords(img, fn, color):
+    """
+    Fill pixels of an image with coordinates matching a filter function. The filter function is evaluated once on
+    the arrays of coordinates of all the pixels and returns a boolean mask.
+    """
+    x, y = pixel_coords(img.shape[0], img.shape[1])
+    mask = np.broadcast_to(fn(x, y), img.shape[:2])
+    img[mask] = color
 
     return img
 
 
 def rotate_fn(fin, cx, cy, theta):
+    cos = math.cos(-theta)
+    sin = math.sin(-theta)
+
     def fout(x, y):
         x = x - cx
         y = y - cy
 
-        x2 = cx + x * math.cos(-theta) - y * math.sin(-theta)
-        y2 = cy + y * math.cos(-theta) + x * math.sin(-theta)
+        x2 = cx + x * cos - y * sin
+        y2 = cy + y * cos + x * sin
 
         return fin(x2, y2)
 
@@ -61,20 +79,14 @@ def point_in_line(x0, y0, x1, y1, r):
     ymax = max(y0, y1) + r
 
     def fn(x, y):
-        # Fast, early escape test
-        if x < xmin or x > xmax or y < ymin or y > ymax:
-            return False
-
-        q = np.array([x, y])
-        pq = q - p0
-
         # Closest point on line
-        a = np.dot(pq, dir)
+        a = (x - p0[0]) * dir[0] + (y - p0[1]) * dir[1]
         a = np.clip(a, 0, dist)
-        p = p0 + a * dir
+        dx = x - (p0[0] + a * dir[0])
+        dy = y - (p0[1] + a * dir[1])
 
-        dist_to_line = np.linalg.norm(q - p)
-        return dist_to_line <= r
+        dist_to_line = np.sqrt(dx * dx + dy * dy)
+        return (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax) & (dist_to_line <= r)
 
     return fn
 
@@ -88,7 +100,7 @@ def point_in_circle(cx, cy, r):
 
 def point_in_rect(xmin, xmax, ymin, ymax):
     def fn(x, y):
-        return x >= xmin and x <= xmax and y >= ymin and y <= ymax
+        return (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
 
     return fn
 
@@ -98,25 +110,27 @@ def point_in_triangle(a, b, c):
     b = np.array(b)
     c = np.array(c)
 
-    def fn(x, y):
-        v0 = c - a
-        v1 = b - a
-        v2 = np.array((x, y)) - a
+    v0 = c - a
+    v1 = b - a
 
-        # Compute dot products
-        dot00 = np.dot(v0, v0)
-        dot01 = np.dot(v0, v1)
-        dot02 = np.dot(v0, v2)
-        dot11 = np.dot(v1, v1)
-        dot12 = np.dot(v1, v2)
+    # Compute dot products
+    dot00 = np.dot(v0, v0)
+    dot01 = np.dot(v0, v1)
+    dot11 = np.dot(v1, v1)
+    inv_denom = 1 / (dot00 * dot11 - dot01 * dot01)
+
+    def fn(x, y):
+        v2x = x - a[0]
+        v2y = y - a[1]
+        dot02 = v0[0] * v2x + v0[1] * v2y
+        dot12 = v1[0] * v2x + v1[1] * v2y
 
         # Compute barycentric coordinates
-        inv_denom = 1 / (dot00 * dot11 - dot01 * dot01)
         u = (dot11 * dot02 - dot01 * dot12) * inv_denom
         v = (dot00 * dot12 - dot01 * dot02) * inv_denom
 
         # Check if point is in triangle
-        return (u >= 0) and (v >= 0) and (u + v) < 1
+        return (u >= 0) & (v >= 0) & ((u + v) < 1)
 
     return fn
 
@@ -129,3 +143,83 @@ def highlight_img(img, color=(255, 255, 255), alpha=0.30):
     blend_img = img + alpha * (np.array(color, dtype=np.uint8) - img)
     blend_img = blend_img.clip(0, 255).astype(np.uint8)
     img[:, :, :] = blend_img
+
+
+def highlight_img_int(img, color=(255, 255, 255), alpha=0.30):
+    """
+    Add highlighting to an image with integer operations only
+    """
+    weight = round(alpha * 256)
+    blend_img = img.astype(np.int32)
+    blend_img += ((np.array(color, dtype=np.int32) - blend_img) * weight) >> 8
+    img[:, :, :] = blend_img
+
+
+class TileCache:
+    """
+    Cache of rendered tiles bounded by the number of bytes of the tiles, the least recently used tiles are evicted
+    first when the cache is full
+    """
+
+    def __init__(self, max_bytes=64 * 2**20):
+        """
+        :param max_bytes: maximum number of bytes of the cached tiles
+        """
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Cached tile of a key, None if the tile is not in the cache
+        """
+        tile = self.tiles.get(key)
+        if tile is None:
+            self.misses += 1
+            return None
+        self.tiles.move_to_end(key)
+        self.hits += 1
+        return tile
+
+    def put(self, key, tile):
+        """
+        Cache a tile, evicting the least recently used tiles if needed
+        """
+        if key in self.tiles:
+            self.nbytes -= self.tiles.pop(key).nbytes
+        self.tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Counters of the cache
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "tiles": len(self.tiles),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        """
+        Remove all the tiles from the cache and reset the counters
+        """
+        self.tiles.clear()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.tiles
+
+    def __len__(self):
+        return len(self.tiles)
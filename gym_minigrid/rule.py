@@ -11,6 +11,41 @@ from typing import Iterable
 #     ruleset = _ruleset
 
 
+# Bit of each property in the compiled rule masks, assigned on first use
+PROPERTY_BITS = {}
+
+# Properties implied by another property
+IMPLIED_PROPERTIES = {
+    # TODO: is_pull, is_agent implies is_stop
+    'is_pull': ['is_block'],
+    'is_agent': ['is_block']
+}
+
+
+def property_bit(property):
+    if property not in PROPERTY_BITS:
+        PROPERTY_BITS[property] = 1 << len(PROPERTY_BITS)
+    return PROPERTY_BITS[property]
+
+
+def compile_ruleset(ruleset, rule_masks=None):
+    """
+    Compile a ruleset into a dict mapping each object type to the bitmask of its active properties. If given,
+    rule_masks is updated in place so that the objects holding a reference to it see the new rules.
+    """
+    rule_masks = {} if rule_masks is None else rule_masks
+    rule_masks.clear()
+    for property, objects in ruleset.items():
+        bits = property_bit(property)
+        for implied_property in IMPLIED_PROPERTIES.get(property, []):
+            bits |= property_bit(implied_property)
+
+        for obj, is_active in objects.items():
+            if is_active:
+                rule_masks[obj] = rule_masks.get(obj, 0) | bits
+    return rule_masks
+
+
 def extract_rule(block_list):
     """
     Take a list of 3 blocks and return the rule object and property if these blocks form a valid rule, otherwise
@@ -56,12 +91,36 @@ def inside_grid(grid, pos):
     return inside_grid
 
 
+def new_ruleset(default_ruleset=None):
+    ruleset = defaultdict(dict)
+    # copy the rules of each property, the rules found in the grid must not be added to the default ruleset
+    ruleset.update({k: dict(v) for k, v in default_ruleset.items()}) if default_ruleset is not None else None
+    return ruleset
+
+
+def extract_is_rules(grid, i, j):
+    """
+    Return the rules formed by the 'is' block at position (i, j) with its horizontal and vertical neighbours, as a
+    tuple of (property, object) pairs
+    """
+    e = grid.get(i, j)
+    rules = []
+    # check for horizontal
+    if inside_grid(grid, (i-1, j)) and inside_grid(grid, (i+1, j)):
+        rules.append(extract_rule([grid.get(i-1, j), e, grid.get(i+1, j)]))
+
+    # check for vertical rules
+    if inside_grid(grid, (i, j-1)) and inside_grid(grid, (i, j+1)):
+        rules.append(extract_rule([grid.get(i, j-1), e, grid.get(i, j+1)]))
+
+    return tuple((rule['property'], rule['object']) for rule in rules if rule is not None)
+
+
 def extract_ruleset(grid, default_ruleset=None):
     """
     Construct the ruleset from the grid. Called every time a RuleBlock is pushed.
     """
-    ruleset = defaultdict(dict)
-    ruleset.update(default_ruleset) if default_ruleset is not None else None
+    ruleset = new_ruleset(default_ruleset)
 
     # loop through all 'is' blocks
     # for k, e in enumerate(grid.grid):
@@ -73,16 +132,80 @@ def extract_ruleset(grid, default_ruleset=None):
             i, j = k % grid.width, k // grid.width
             assert k == j * grid.width + i
 
-            # check for horizontal
-            if inside_grid(grid, (i-1, j)) and inside_grid(grid, (i+1, j)):
-                left_cell = grid.get(i-1, j)
-                right_cell = grid.get(i+1, j)
-                add_rule([left_cell, e, right_cell], ruleset)
-
-            # check for vertical rules
-            if inside_grid(grid, (i, j-1)) and inside_grid(grid, (i, j+1)):
-                up_cell = grid.get(i, j-1)
-                down_cell = grid.get(i, j+1)
-                add_rule([up_cell, e, down_cell], ruleset)
+            for property, obj in extract_is_rules(grid, i, j):
+                ruleset[property][obj] = True
 
     return ruleset
+
+
+class IncrementalRuleset:
+    """
+    Maintain the ruleset of a grid across steps. Only the rules whose 3-cell window overlaps a cell changed since the
+    last update are re-evaluated, the result is the same as extract_ruleset.
+    """
+
+    def __init__(self, grid, default_ruleset=None):
+        self.grid = grid
+        self.default_ruleset = default_ruleset
+        self._changes = grid.track_changes()
+
+        # rules formed around each 'is' block, indexed by the (i, j) position of the block
+        self._is_rules = {}
+        for k, e in enumerate(grid):
+            if e is not None and e.type == 'rule_is':
+                i, j = k % grid.width, k // grid.width
+                self._is_rules[(i, j)] = extract_is_rules(grid, i, j)
+
+        # incremented every time the ruleset changes
+        self.version = 0
+        self.ruleset = self._build_ruleset()
+
+    def update(self):
+        """
+        Update the ruleset with the changes made to the grid since the last call and return it
+        """
+        if not self._changes:
+            return self.ruleset
+
+        # positions of the 'is' blocks whose rule windows may overlap a changed cell
+        candidates = set()
+        for i, j in self._changes:
+            candidates.update([(i, j), (i-1, j), (i+1, j), (i, j-1), (i, j+1)])
+        self._changes.clear()
+
+        changed = False
+        for pos in candidates:
+            if not inside_grid(self.grid, pos):
+                continue
+
+            e = self.grid.get(*pos)
+            if e is not None and e.type == 'rule_is':
+                rules = extract_is_rules(self.grid, *pos)
+                if self._is_rules.get(pos) != rules:
+                    self._is_rules[pos] = rules
+                    changed = True
+            elif pos in self._is_rules:
+                del self._is_rules[pos]
+                changed = True
+
+        if changed:
+            ruleset = self._build_ruleset()
+            if ruleset != self.ruleset:
+                self.ruleset = ruleset
+                self.version += 1
+        return self.ruleset
+
+    def discard_changes(self):
+        """
+        Forget the cells changed since the last update, for a caller that knows that no rule block was at the top of
+        these cells before or after the changes, which can't change the rules
+        """
+        self._changes.clear()
+
+    def _build_ruleset(self):
+        ruleset = new_ruleset(self.default_ruleset)
+        # same order as the grid scan of extract_ruleset
+        for (i, j) in sorted(self._is_rules, key=lambda pos: (pos[1], pos[0])):
+            for property, obj in self._is_rules[(i, j)]:
+                ruleset[property][obj] = True
+        return ruleset
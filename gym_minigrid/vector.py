@@ -0,0 +1,455 @@
+import gym
+import numpy as np
+from gym import spaces
+from gym.utils.step_api_compatibility import step_api_compatibility
+from gym.vector import VectorEnv
+
+from gym_minigrid.babaisyou import (BabaIsYouEnv, DIR_TO_VEC, EMPTY_RECORD, FIELD_DIR, NUM_FIELDS, TILE_PIXELS,
+                                   encode_stacks, render_grids, zobrist_keys)
+from gym_minigrid.envs.core.flexible_world_object import (FBall, FDoor, FKey, FWall, Baba, RuleIs, RuleObject,
+                                                          RuleProperty, objects)
+from gym_minigrid.minigrid import OBJECT_TO_IDX, Wall
+
+# Bits of the properties of the objects of a type in the tables of the engine
+PUSH, OVERLAP, WIN, DEFEAT, PULL, AGENT, MOVE = (1 << k for k in range(7))
+
+# Property of the rules giving each bit
+RULE_PROPERTIES = {PUSH: 'can_push', WIN: 'is_goal', DEFEAT: 'is_defeat', PULL: 'is_pull', AGENT: 'is_agent',
+                   MOVE: 'is_move'}
+
+# Classes of the objects whose properties only depend on their type and the ruleset of the env
+FLEXIBLE_CLASSES = (FBall, FDoor, FKey, FWall, Baba)
+RULE_CLASSES = (RuleIs, RuleObject, RuleProperty)
+
+# Methods of BabaIsYouEnv implementing the game logic resolved by the engine
+ENGINE_METHODS = ['apply_action', 'move', 'change_obj_pos', 'is_win_pos', 'is_lose_pos', 'scan_objects', 'rule_types',
+                  '_update_ruleset']
+
+# Type indices of the objects whose properties are given by the ruleset and of the rule blocks
+FLEXIBLE_TYPES = np.zeros(256, dtype=np.bool_)
+FLEXIBLE_TYPES[[OBJECT_TO_IDX[t] for t in objects]] = True
+RULE_TYPES = np.zeros(256, dtype=np.bool_)
+RULE_TYPES[[OBJECT_TO_IDX[t] for t in ['rule', 'rule_object', 'rule_is', 'rule_property']]] = True
+
+# Direction of the agent after each action, -1 for idle
+ACTION_DIRS = np.array([-1] + [BabaIsYouEnv.ACTION_TO_DIR[a] for a in list(BabaIsYouEnv.Actions)[1:]])
+
+# Vector of each direction
+DIR_VECS = np.array(DIR_TO_VEC)
+
+# Packed record of an empty stack level and mask of the direction field, as uint32
+EMPTY_RECORD32 = np.array(EMPTY_RECORD, dtype=np.uint8).view(np.uint32)[0]
+DIR_SHIFT = np.uint32(8 * FIELD_DIR)
+DIR_MASK = np.uint32(0xFF) << DIR_SHIFT
+
+
+class BabaIsYouVecEngine(VectorEnv):
+    """
+    Vectorized environment stepping a batch of BabaIsYouEnv in the current process.
+
+    The packed cells and slots of the N grids are stored in single (N, height, width, max_stack, ...) arrays. The
+    moves of a step are resolved for all the envs at once with array operations on these arrays: the agent of each
+    env turns, the chain of objects it pushes is scanned along its direction and the chains are moved from front to
+    back in lockstep, then win and lose are read from the properties of the cells. The objects of the grids are then
+    updated from the moves, and the ruleset of an env is only updated when a rule block was moved. The envs that the
+    array resolver doesn't handle for a step (objects that can be pulled or move by themselves, several agents,
+    objects with custom behaviour or a grid modified outside of the engine) are stepped by BabaIsYouEnv.apply_action.
+
+    After each step, the cells changed in all the grids are encoded at once into the (N, width, height,
+    3*encoding_level) batch of observations. An env is reset as soon as its episode is done, the last observation of
+    the episode is returned in infos["final_observation"].
+    """
+
+    def __init__(self, env_fns, copy=True, new_step_api=False, out=None):
+        """
+        :param env_fns: functions creating the envs, the envs must be unwrapped BabaIsYouEnv with the same observation
+            space
+        :param copy: return a copy of the batch of observations instead of the array updated in place at each step
+        :param out: uint8 array with the shape of the observation space (e.g. in shared memory) in which the batch of
+            observations is written, allocated if None
+        """
+        self.envs = [env_fn() for env_fn in env_fns]
+        env = self.envs[0]
+        for e in self.envs:
+            assert isinstance(e, BabaIsYouEnv), "the envs must be unwrapped BabaIsYouEnv"
+            assert e.observation_space == env.observation_space
+
+        # same attributes as VectorEnv.__init__, the batched spaces are built directly because batch_space deep copies
+        # the random generators of the spaces, which fails with recent versions of numpy
+        self.num_envs = len(self.envs)
+        self.is_vector_env = True
+        self.observation_space = spaces.Box(
+            low=0,
+            high=255,
+            shape=(self.num_envs, *env.observation_space.shape),
+            dtype="uint8",
+        )
+        self.action_space = spaces.MultiDiscrete(np.full(self.num_envs, env.action_space.n))
+        self.closed = False
+        self.viewer = None
+        self.single_observation_space = env.observation_space
+        self.single_action_space = env.action_space
+        self.new_step_api = new_step_api
+        self.copy = copy
+        self.encoding_level = env.encoding_level
+
+        # the capacity of the stacks grows with the grids
+        self.cells = np.empty((self.num_envs, env.height, env.width, 0, NUM_FIELDS), dtype=np.uint8)
+        self.slots = np.zeros((self.num_envs, env.height, env.width, 0), dtype=np.int32)
+        self.depth = np.zeros((self.num_envs, env.height, env.width), dtype=np.int32)
+        self._records = self.cells.view(np.uint32)[..., 0]
+        if out is None:
+            out = np.zeros(self.observation_space.shape, dtype=np.uint8)
+        assert out.shape == self.observation_space.shape and out.dtype == np.uint8
+        self.observations = out
+
+        # grid of each env, slice of self.cells bound to the grid and set recording the cells changed in the grid
+        self._grids = [None] * self.num_envs
+        self._cells = [None] * self.num_envs
+        self._changes = [None] * self.num_envs
+
+        # properties of the objects of each type whose properties are given by the ruleset, properties of the other
+        # objects by slot, number of objects of each type in each env, and whether an env is always stepped by
+        # apply_action
+        self._props = np.zeros((self.num_envs, 256), dtype=np.uint8)
+        self._slot_props = np.zeros((self.num_envs, 0), dtype=np.uint8)
+        self._counts = np.zeros((self.num_envs, 256), dtype=np.int32)
+        self._scalar = np.zeros((self.num_envs,), dtype=np.bool_)
+
+        self._rewards = np.zeros((self.num_envs,), dtype=np.float64)
+        self._dones = np.zeros((self.num_envs,), dtype=np.bool_)
+        self._actions = None
+
+        for k in range(self.num_envs):
+            self._bind_grid(k)
+
+    def _bind_grid(self, k):
+        """
+        Store the grid of the k-th env in the batch of grids and encode its observation
+        """
+        grid = self.envs[k].grid
+        if grid.max_stack > self.cells.shape[3]:
+            self._grow_stacks(grid.max_stack)
+
+        self._cells[k] = self.cells[k]
+        grid.bind(self._cells[k], self.depth[k], self.slots[k])
+        if grid is not self._grids[k]:
+            if self._grids[k] is not None:
+                self._grids[k].untrack_changes(self._changes[k])
+            self._grids[k] = grid
+            self._changes[k] = grid.track_changes()
+        self._changes[k].clear()
+        grid.encode(out=self.observations[k])
+        self._inspect(k)
+
+    def _inspect(self, k):
+        """
+        Update the tables of the k-th env used by the array resolver from the objects of its grid and its ruleset
+        """
+        env = self.envs[k]
+        grid = env.grid
+        scalar = any(getattr(type(env), name) is not getattr(BabaIsYouEnv, name) for name in ENGINE_METHODS)
+        for cell in grid.grid:
+            for obj in cell[1:]:
+                if type(obj) in FLEXIBLE_CLASSES:
+                    scalar = scalar or obj._rule_masks is not env._rule_masks
+                elif type(obj) not in RULE_CLASSES and type(obj) is not Wall:
+                    scalar = True
+        self._scalar[k] = scalar
+
+        # the properties of the rule blocks and the walls don't depend on the ruleset, they are stored by slot
+        if len(grid.objects) >= self._slot_props.shape[1]:
+            slot_props = np.zeros((self.num_envs, 2 * len(grid.objects)), dtype=np.uint8)
+            slot_props[:, :self._slot_props.shape[1]] = self._slot_props
+            self._slot_props = slot_props
+        self._slot_props[k] = 0
+        self._slot_props[k, 0] = OVERLAP
+        for slot, obj in enumerate(grid.objects, 1):
+            if type(obj) in RULE_CLASSES and obj.can_push():
+                self._slot_props[k, slot] = PUSH
+
+        self._counts[k] = 0
+        for type_name, positions in grid.type_index.items():
+            self._counts[k, OBJECT_TO_IDX[type_name]] = sum(positions.values())
+        self._update_props(k)
+
+    def _update_props(self, k):
+        """
+        Update the properties of the types of objects of the k-th env from its ruleset
+        """
+        env = self.envs[k]
+        props = self._props[k]
+        props[:] = 0
+        props[FLEXIBLE_TYPES] = OVERLAP
+        for bit, property in RULE_PROPERTIES.items():
+            props[[OBJECT_TO_IDX[t] for t in env.rule_types(property) if t in objects]] |= bit
+        props[[OBJECT_TO_IDX[t] for t in env.rule_types('is_block') if t in objects]] &= ~np.uint8(OVERLAP)
+
+    def _grow_stacks(self, max_stack):
+        """
+        Increase the capacity of the stacks of the batch of grids
+        """
+        cells = self.cells
+        capacity = max(max_stack, 2 * cells.shape[3])
+        self.cells = np.empty((*cells.shape[:3], capacity, NUM_FIELDS), dtype=np.uint8)
+        self.slots = np.zeros((*cells.shape[:3], capacity), dtype=np.int32)
+        self._records = self.cells.view(np.uint32)[..., 0]
+        for k, grid in enumerate(self._grids):
+            if grid is not None and grid.cells is self._cells[k]:
+                self._cells[k] = self.cells[k]
+                grid.bind(self._cells[k], self.depth[k], self.slots[k])
+
+    def _encode_changes(self):
+        """
+        Update the observations of the cells changed in all the grids
+        """
+        positions = [(k, i, j) for k, changes in enumerate(self._changes) for i, j in changes]
+        if len(positions) == 0:
+            return
+        for changes in self._changes:
+            changes.clear()
+
+        k, i, j = np.array(positions).T
+        self.observations[k, i, j] = encode_stacks(self.depth[k, j, i], self.cells[k, j, i], self.encoding_level)
+
+    def reset_wait(self, seed=None, return_info=False, options=None):
+        if seed is None:
+            seed = [None for _ in range(self.num_envs)]
+        if isinstance(seed, int):
+            seed = [seed + k for k in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+
+        infos = {}
+        for k, (env, single_seed) in enumerate(zip(self.envs, seed)):
+            if return_info:
+                _, info = env.reset(seed=single_seed, return_info=True, options=options)
+                infos = self._add_info(infos, info, k)
+            else:
+                env.reset(seed=single_seed, options=options)
+            self._bind_grid(k)
+
+        observations = self.observations.copy() if self.copy else self.observations
+        if return_info:
+            return observations, infos
+        return observations
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        actions = np.asarray(self._actions, dtype=np.int64)
+        directions = ACTION_DIRS[np.clip(actions, 0, len(ACTION_DIRS) - 1)]
+
+        # envs stepped by apply_action: objects that can be pulled or move by themselves, several agents, agents under
+        # other objects, unknown actions and grids modified since the last step
+        scalar = self._scalar | (actions < 0) | (actions >= len(ACTION_DIRS))
+        scalar |= np.array([len(changes) > 0 for changes in self._changes])
+        present = self._counts > 0
+        scalar |= (present & (self._props & (PULL | MOVE) != 0)).any(1)
+        tops = self._top_records()
+        is_agent = self._props[np.arange(self.num_envs)[:, None, None], tops & 0xFF] & AGENT != 0
+        n_agents = is_agent.sum((1, 2))
+        scalar |= (n_agents > 1) | (n_agents != (self._counts * (self._props & AGENT != 0)).sum(1))
+
+        # resolve the moves of the agents of the other envs
+        ks = np.flatnonzero(~scalar & (directions >= 0) & (n_agents == 1))
+        _, y, x = np.nonzero(is_agent[ks])
+        moves, agents, rule_changed = self._resolve_moves(ks, x, y, directions[ks])
+
+        # update the objects of the grids from the moves
+        zobrist = np.zeros((self.num_envs,), dtype=np.uint64)
+        np.bitwise_xor.at(zobrist, moves[0], moves[-1])
+        for k, i, j, new_i, new_j, d in zip(*(m.tolist() for m in moves[:6])):
+            self._grids[k].sync_move(i, j, new_i, new_j, d)
+        for k in np.flatnonzero(zobrist).tolist():
+            self._grids[k].zobrist ^= int(zobrist[k])
+        agents = dict(zip(ks.tolist(), zip(*(a.tolist() for a in agents))))
+
+        for k, env in enumerate(self.envs):
+            if scalar[k]:
+                self._rewards[k], self._dones[k] = env.apply_action(actions[k])
+                if env.grid.cells is not self._cells[k]:
+                    # the stacks of the grid have grown beyond the capacity of the batch
+                    self._bind_grid(k)
+                else:
+                    self._inspect(k)
+                continue
+
+            # same updates as apply_action
+            env.step_count += 1
+            reward, done = 0, False
+            if directions[k] >= 0:
+                env.agent_dir = int(directions[k])
+                is_win, is_lose = False, False
+                if k in agents:
+                    new_i, new_j, is_win, is_lose = agents[k]
+                    env.agent_pos = (new_i, new_j)
+                    env.grid.get(new_i, new_j).has_moved = True
+                env.is_win, env.is_lose = is_win, is_lose
+                reward, done = env.reward()
+
+                if rule_changed[k]:
+                    version = env.ruleset_version
+                    env._update_ruleset()
+                    if env.ruleset_version != version:
+                        self._update_props(k)
+                else:
+                    env._rule_tracker.discard_changes()
+            if env.step_count >= env.max_steps:
+                done = True
+            self._rewards[k], self._dones[k] = reward, done
+        self._encode_changes()
+
+        infos = {}
+        for k in np.flatnonzero(self._dones):
+            infos = self._add_info(infos, {"final_observation": self.observations[k].copy()}, k)
+            self.envs[k].reset()
+            self._bind_grid(k)
+
+        return step_api_compatibility(
+            (
+                self.observations.copy() if self.copy else self.observations,
+                np.copy(self._rewards),
+                np.copy(self._dones),
+                infos,
+            ),
+            new_step_api=self.new_step_api,
+            is_vector_env=True,
+        )
+
+    def _top_records(self):
+        """
+        Packed records (as uint32) of the objects at the top of the cells of all the grids, the record of an empty
+        stack level for the empty cells. The records of a grid whose stacks have outgrown the batch are meaningless.
+        """
+        top = np.clip(self.depth - 1, 0, self.cells.shape[3] - 1)
+        return np.take_along_axis(self._records, top[..., None], axis=3)[..., 0]
+
+    def _top_records_at(self, k, i, j):
+        """
+        Packed records of the objects at the top of the cells (i, j) of the envs k
+        """
+        return self._records[k, j, i, np.maximum(self.depth[k, j, i] - 1, 0)]
+
+    def _top_props_at(self, k, i, j):
+        """
+        Properties of the objects at the top of the cells (i, j) of the envs k, OVERLAP for the empty cells
+        """
+        z = np.maximum(self.depth[k, j, i] - 1, 0)
+        types = self._records[k, j, i, z] & 0xFF
+        return np.where(FLEXIBLE_TYPES[types], self._props[k, types], self._slot_props[k, self.slots[k, j, i, z]])
+
+    def _resolve_moves(self, ks, x, y, directions):
+        """
+        Move the agents of the envs ks at (x, y) in the given directions, pushing the chains of objects in front of
+        them, like BabaIsYouEnv.move without pulled objects
+        :return: the (k, i, j, new_i, new_j, direction, zobrist key) arrays of the moves (a turn if (new_i, new_j) is
+            (i, j)) in the order in which they were made, the (new_i, new_j, is_win, is_lose) arrays of the agents and
+            a boolean array telling whether a rule block was moved or uncovered in each env
+        """
+        moves = []
+        rule_changed = np.zeros((self.num_envs,), dtype=np.bool_)
+        height, width = self.depth.shape[1:]
+        dx, dy = DIR_VECS[directions].T
+        directions = directions.astype(np.uint32)
+
+        # turn the agents
+        z = self.depth[ks, y, x] - 1
+        records = self._records[ks, y, x, z]
+        turned = (records & ~DIR_MASK) | (directions << DIR_SHIFT)
+        self._records[ks, y, x, z] = turned
+        changed = turned != records
+        keys = zobrist_keys(x, y, z, records) ^ zobrist_keys(x, y, z, turned)
+        moves.append((ks[changed], x[changed], y[changed], x[changed], y[changed], directions[changed], keys[changed]))
+
+        # positions of the objects pushed by the agents, front last
+        chains = [(x, y)]
+        length = np.zeros(len(ks), dtype=np.int64)
+        pushed = np.ones(len(ks), dtype=np.bool_)
+        while pushed.any():
+            i, j = chains[-1][0] + dx, chains[-1][1] + dy
+            inside = (i >= 0) & (i < width) & (j >= 0) & (j < height)
+            i, j = np.where(inside, i, 0), np.where(inside, j, 0)
+            pushed &= inside & (self._top_props_at(ks, i, j) & PUSH != 0)
+            length += pushed
+            chains.append((i, j))
+
+        # move the chains from the front to the agent, an object moves if the cell in front of it is empty or can be
+        # overlapped once the objects in front of it have moved
+        for m in reversed(range(len(chains) - 1)):
+            sel = np.flatnonzero(length >= m)
+            k, i, j = ks[sel], chains[m][0][sel], chains[m][1][sel]
+            new_i, new_j = i + dx[sel], j + dy[sel]
+            inside = (new_i >= 0) & (new_i < width) & (new_j >= 0) & (new_j < height)
+            new_i, new_j = np.where(inside, new_i, i), np.where(inside, new_j, j)
+            front = self._top_props_at(k, new_i, new_j)
+            can_move = inside & (front & OVERLAP != 0)
+
+            if m == 0:
+                # win or lose with the top object of the cell where the agent ends, before it moves
+                reached = np.where(can_move, front, self._top_props_at(k, i, j))
+                agents = (np.where(can_move, new_i, i), np.where(can_move, new_j, j), reached & WIN != 0,
+                          reached & DEFEAT != 0)
+
+            k, i, j, new_i, new_j = k[can_move], i[can_move], j[can_move], new_i[can_move], new_j[can_move]
+            d = directions[sel][can_move]
+            if (self.depth[k, new_j, new_i] >= self.cells.shape[3]).any():
+                self._grow_stacks(self.cells.shape[3] + 1)
+
+            z = self.depth[k, j, i] - 1
+            records = self._records[k, j, i, z]
+            slots = self.slots[k, j, i, z]
+            self._records[k, j, i, z] = EMPTY_RECORD32
+            self.slots[k, j, i, z] = 0
+            self.depth[k, j, i] = z
+
+            new_z = self.depth[k, new_j, new_i]
+            new_records = (records & ~DIR_MASK) | (d << DIR_SHIFT)
+            self._records[k, new_j, new_i, new_z] = new_records
+            self.slots[k, new_j, new_i, new_z] = slots
+            self.depth[k, new_j, new_i] = new_z + 1
+
+            keys = zobrist_keys(i, j, z, records) ^ zobrist_keys(new_i, new_j, new_z, new_records)
+            moves.append((k, i, j, new_i, new_j, d, keys))
+            uncovered = self._top_records_at(k, i, j) & 0xFF
+            rule_changed[k[RULE_TYPES[records & 0xFF] | RULE_TYPES[uncovered]]] = True
+
+        if len(chains) == 1:
+            agents = (x, y, np.zeros(len(ks), dtype=np.bool_), np.zeros(len(ks), dtype=np.bool_))
+        moves = tuple(np.concatenate(field) for field in zip(*moves))
+        return moves, agents, rule_changed
+
+    def render_frames(self, tile_size=TILE_PIXELS, out=None):
+        """
+        Render the grids of all the envs into a single (num_envs, height_px, width_px, 3) array
+        :param out: array in which the frames are written, a new array is allocated if None
+        """
+        return render_grids(self._grids, tile_size=tile_size, out=out, subdivs=self.envs[0].render_subdivs)
+
+    def call(self, name, *args, **kwargs):
+        results = []
+        for env in self.envs:
+            function = getattr(env, name)
+            if callable(function):
+                results.append(function(*args, **kwargs))
+            else:
+                results.append(function)
+        return tuple(results)
+
+    def close_extras(self, **kwargs):
+        for env in self.envs:
+            env.close()
+
+
+def make_vec(env_id, num_envs, copy=True, new_step_api=False, out=None, **kwargs):
+    """
+    Create a BabaIsYouVecEngine with num_envs instances of a registered BabaIsYou env
+    :param kwargs: arguments of the envs
+    """
+    if env_id not in gym.envs.registry:
+        from gym_minigrid import register_minigrid_envs
+        register_minigrid_envs()
+
+    def make_env():
+        return gym.make(env_id, disable_env_checker=True, **kwargs).unwrapped
+    return BabaIsYouVecEngine([make_env for _ in range(num_envs)], copy=copy, new_step_api=new_step_api, out=out)
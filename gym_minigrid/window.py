@@ -1,3 +1,5 @@
+import cv2
+
 # Only ask users to install matplotlib if they actually need it
 try:
     import matplotlib.pyplot as plt
@@ -35,6 +37,21 @@ class Window:
 
         self.fig.canvas.mpl_connect("close_event", close_handler)
 
+        # With blitting, the image is drawn over a copy of the rest of the figure instead of redrawing the whole figure,
+        # the copy is taken again each time the figure is fully redrawn (e.g. when the window is resized)
+        self.blit = self.fig.canvas.supports_blit
+        self.background = None
+
+        def draw_handler(evt):
+            self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+            if not self.no_image_shown:
+                self.ax.draw_artist(self.imshow_obj)
+
+        if self.blit:
+            self.fig.canvas.mpl_connect("draw_event", draw_handler)
+
+        self.timer = None
+
     def show_img(self, img):
         """
         Show an image or update the image being shown
@@ -43,17 +60,41 @@ class Window:
         # If no image has been shown yet,
         # show the first image of the environment
         if self.no_image_shown:
-            self.imshow_obj = self.ax.imshow(img, interpolation="bilinear")
+            # the extent of the image is fixed, the images can be scaled to the size of the axes
+            height, width = img.shape[:2]
+            self.imshow_obj = self.ax.imshow(img, interpolation="bilinear", animated=self.blit,
+                                             extent=(-0.5, width - 0.5, height - 0.5, -0.5))
             self.no_image_shown = False
+            if self.blit:
+                # draw the figure and take the copy of the background
+                self.fig.canvas.draw()
         # Update the image data
-        self.imshow_obj.set_data(img)
-
-        # Request the window be redrawn
-        self.fig.canvas.draw_idle()
-        self.fig.canvas.flush_events()
+        self.imshow_obj.set_data(self.fit_img(img) if self.blit else img)
+
+        if self.blit and self.background is not None:
+            # Only redraw the image
+            self.fig.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.imshow_obj)
+            self.fig.canvas.blit(self.ax.bbox)
+            self.fig.canvas.flush_events()
+        else:
+            # Request the window be redrawn
+            self.fig.canvas.draw_idle()
+            self.fig.canvas.flush_events()
+
+            # Let matplotlib process UI events
+            plt.pause(0.001)
+
+    def fit_img(self, img):
+        """
+        Downscale an image larger than the axes to their size in pixels, matplotlib resamples the whole image at each
+        draw and the cost of resampling grows with the size of the image
+        """
 
-        # Let matplotlib process UI events
-        plt.pause(0.001)
+        width, height = int(self.ax.bbox.width), int(self.ax.bbox.height)
+        if img.shape[1] > width and img.shape[0] > height:
+            img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+        return img
 
     def set_caption(self, text):
         """
@@ -70,6 +111,16 @@ class Window:
         # Keyboard handler
         self.fig.canvas.mpl_connect("key_press_event", key_handler)
 
+    def reg_timer(self, callback, fps=60):
+        """
+        Call a function at a fixed rate from the event loop, e.g. to apply the actions queued by the key handler and
+        redraw once per frame instead of once per key event
+        """
+
+        self.timer = self.fig.canvas.new_timer(interval=1000 / fps)
+        self.timer.add_callback(callback)
+        self.timer.start()
+
     def show(self, block=True):
         """
         Show the window, and start an event loop
@@ -89,5 +140,7 @@ class Window:
         Close the window
         """
 
+        if self.timer is not None:
+            self.timer.stop()
         plt.close()
         self.closed = True
@@ -1,13 +1,19 @@
 import math
 import operator
+import queue
+import threading
 from functools import reduce
 
+import cv2
 import gym
 import numpy as np
 from gym import spaces
 from gym.core import ObservationWrapper, Wrapper
 
-from gym_minigrid.minigrid import COLOR_TO_IDX, OBJECT_TO_IDX, STATE_TO_IDX, Goal
+from gym_minigrid.babaisyou import FIELD_COLOR, FIELD_DIR, FIELD_TYPE, BabaIsYouGrid, gather_tiles
+from gym_minigrid.envs.core.flexible_world_object import decode_obj, objects, properties
+from gym_minigrid.minigrid import COLOR_TO_IDX, OBJECT_TO_IDX, STATE_TO_IDX, TILE_PIXELS, Goal
+from gym_minigrid.rendering import TileCache
 
 
 class ReseedWrapper(Wrapper):
@@ -524,3 +530,361 @@ class SymbolicObsWrapper(ObservationWrapper):
         grid = np.transpose(grid, (1, 2, 0))
         obs["image"] = grid
         return obs
+
+
+class VideoRecorder(Wrapper):
+    """
+    Wrapper recording the frames of a BabaIsYouEnv in a video or a sequence of images.
+
+    At each reset and step, the packed records of the objects at the top of the cells are put in a bounded queue and a
+    background thread renders them with its own tile cache and writes the frames with OpenCV. The stepping loop only
+    waits when the queue is full.
+    """
+
+    def __init__(self, env, path, fps=10, tile_size=TILE_PIXELS, max_queue=64, fourcc="mp4v"):
+        """
+        :param path: path of the video file, or format string of the paths of the images with the index of the frame
+            (e.g. "frames/{:06d}.png")
+        :param max_queue: maximum number of frames waiting to be rendered
+        """
+        super().__init__(env)
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.tile_size = tile_size
+        self.subdivs = getattr(self.unwrapped, "render_subdivs", 3)
+        self.n_frames = 0
+
+        self.tile_cache = TileCache()
+        self._writer = None
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = threading.Thread(target=self._write_frames, daemon=True)
+        self._worker.start()
+
+    def reset(self, **kwargs):
+        outputs = self.env.reset(**kwargs)
+        self._record()
+        return outputs
+
+    def step(self, action):
+        outputs = self.env.step(action)
+        self._record()
+        return outputs
+
+    def _record(self):
+        if self._error is not None:
+            raise self._error
+        records, _ = self.unwrapped.grid.top_records()
+        self._queue.put(records)
+
+    def _write_frames(self):
+        while True:
+            records = self._queue.get()
+            try:
+                if records is None:
+                    break
+                if self._error is None:
+                    self._write_frame(self.render_records(records))
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def render_records(self, records):
+        """
+        Render the frame of a (height, width) array of packed records
+        """
+        unique, inverse = np.unique(records, return_inverse=True)
+        tiles = np.empty((len(unique), self.tile_size, self.tile_size, 3), dtype=np.uint8)
+        for k, record in enumerate(unique):
+            tile = self.tile_cache.get(record)
+            if tile is None:
+                fields = np.array([record], dtype=np.uint32).view(np.uint8)
+                obj = decode_obj(*(int(x) for x in fields)) if record != 0 else None
+                tile = BabaIsYouGrid.draw_tile(obj, tile_size=self.tile_size, subdivs=self.subdivs)
+                tile = tile.astype(np.uint8, copy=False)
+                self.tile_cache.put(record, tile)
+            tiles[k] = tile
+        return gather_tiles(tiles, inverse.reshape(records.shape))
+
+    def _write_frame(self, frame):
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        if "{" in self.path:
+            cv2.imwrite(self.path.format(self.n_frames), frame)
+        else:
+            if self._writer is None:
+                height, width = frame.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(*self.fourcc)
+                self._writer = cv2.VideoWriter(self.path, fourcc, self.fps, (width, height))
+            self._writer.write(frame)
+        self.n_frames += 1
+
+    def flush(self):
+        """
+        Wait until all the recorded frames are written
+        """
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        super().close()
+        if self._error is not None:
+            raise self._error
+
+
+class BabaIsYouOneHotObsWrapper(ObservationWrapper):
+    """
+    Wrapper to get a one-hot encoding of the (width, height, 3*encoding_level) observation of a BabaIsYouEnv.
+
+    Each of the encoding_level objects of a cell is encoded with len(OBJECT_TO_IDX) bits for its type,
+    len(COLOR_TO_IDX) bits for its color and len(STATE_TO_IDX) bits for its state. The bit set by each value of each
+    channel of the observation is precomputed in a lookup table, the one-hot observation is written in a buffer reused
+    at each step.
+    """
+
+    def __init__(self, env, out=None):
+        """
+        :param out: (width, height, encoding_level * num_bits) uint8 C-contiguous array in which the observations are
+            written, allocated by the wrapper if None. The same array is returned at each step.
+        """
+        super().__init__(env)
+
+        width, height, channels = env.observation_space.shape
+        field_sizes = [len(OBJECT_TO_IDX), len(COLOR_TO_IDX), len(STATE_TO_IDX)]
+        # Number of bits per object
+        self.num_bits = sum(field_sizes)
+        self.observation_space = spaces.Box(
+            low=0, high=1, shape=(width, height, channels // 3 * self.num_bits), dtype="uint8"
+        )
+
+        # lut[c, v] is the index in the one-hot encoding of a cell of the bit set by the value v of the channel c,
+        # -1 for the invalid values
+        self.lut = np.full((channels, 256), -1, dtype=np.int64)
+        for c in range(channels):
+            level, field = divmod(c, 3)
+            offset = level * self.num_bits + sum(field_sizes[:field])
+            self.lut[c, :field_sizes[field]] = offset + np.arange(field_sizes[field])
+        # index of the first bit of each cell in the flattened one-hot encoding
+        self.cell_offsets = np.arange(width * height).reshape(width, height, 1) * self.observation_space.shape[2]
+        self.channels = np.arange(channels)
+
+        if out is None:
+            out = np.zeros(self.observation_space.shape, dtype=np.uint8)
+        assert out.shape == self.observation_space.shape and out.dtype == np.uint8 and out.flags.c_contiguous
+        self.out = out
+
+    def observation(self, obs):
+        bits = self.lut[self.channels, obs]
+        if (bits < 0).any():
+            raise ValueError("invalid value in the observation")
+        self.out.fill(0)
+        np.put(self.out, self.cell_offsets + bits, 1)
+        return self.out
+
+
+class RulesetObsWrapper(ObservationWrapper):
+    """
+    Wrapper adding the active ruleset of a BabaIsYouEnv to the observation, as a (len(objects), len(properties))
+    boolean array in the order of the objects and properties lists of flexible_world_object.
+
+    The array is only built again when the ruleset changes, the same read-only array is returned as long as the rules
+    in the array don't change.
+    """
+
+    def __init__(self, env):
+        super().__init__(env)
+        self.object_index = {obj: k for k, obj in enumerate(objects)}
+        self.property_index = {prop: k for k, prop in enumerate(properties)}
+
+        rules_space = spaces.Box(low=0, high=1, shape=(len(objects), len(properties)), dtype=bool)
+        self.observation_space = spaces.Dict({"image": env.observation_space, "rules": rules_space})
+
+        self.rules = None
+        self._rules_version = None
+
+    def reset(self, **kwargs):
+        # new episode, new ruleset
+        self._rules_version = None
+        return super().reset(**kwargs)
+
+    def observation(self, obs):
+        env = self.unwrapped
+        if env.ruleset_version != self._rules_version:
+            self._rules_version = env.ruleset_version
+            rules = self.encode_ruleset(env.get_ruleset())
+            if self.rules is None or not np.array_equal(rules, self.rules):
+                self.rules = rules
+        return {"image": obs, "rules": self.rules}
+
+    def encode_ruleset(self, ruleset):
+        """
+        Boolean array of the rules of a ruleset
+        """
+        rules = np.zeros(self.observation_space["rules"].shape, dtype=bool)
+        for prop, objs in ruleset.items():
+            if prop not in self.property_index:
+                continue
+            for obj, is_active in objs.items():
+                if is_active and obj in self.object_index:
+                    rules[self.object_index[obj], self.property_index[prop]] = True
+        rules.flags.writeable = False
+        return rules
+
+
+class FrameStackObsWrapper(Wrapper):
+    """
+    Wrapper stacking the last k observations of a BabaIsYouEnv or of a BabaIsYouVecEngine, along a new first axis for an
+    env and along a new axis after the batch axis for a vector env.
+
+    The observations are stored twice in a circular buffer of 2*k observations, so that the last k observations are
+    always contiguous in the buffer and the stack is returned as a view of the buffer, without copying the k
+    observations. The view is only valid until the next step. At reset, the stack is filled with the first
+    observation, for a vector env the stack of each env is filled again when the env is reset after the end of an
+    episode.
+    """
+
+    def __init__(self, env, k=4):
+        super().__init__(env)
+        self.k = k
+        self.is_vector_env = getattr(env, "is_vector_env", False)
+
+        space = env.observation_space
+        # axis of the stacked observations
+        self.axis = 1 if self.is_vector_env else 0
+        self.observation_space = spaces.Box(
+            low=np.repeat(np.expand_dims(space.low, self.axis), k, axis=self.axis),
+            high=np.repeat(np.expand_dims(space.high, self.axis), k, axis=self.axis),
+            dtype=space.dtype,
+        )
+
+        shape = list(self.observation_space.shape)
+        shape[self.axis] = 2 * k
+        self.buffer = np.zeros(shape, dtype=space.dtype)
+        # index in the buffer of the last observation
+        self.pos = k - 1
+
+    def reset(self, **kwargs):
+        outputs = self.env.reset(**kwargs)
+        obs = outputs[0] if kwargs.get("return_info", False) else outputs
+        self.pos = self.k - 1
+        if self.is_vector_env:
+            self.buffer[:] = obs[:, None]
+        else:
+            self.buffer[:] = obs
+        stack = self.stack()
+        return (stack, outputs[1]) if kwargs.get("return_info", False) else stack
+
+    def step(self, action):
+        outputs = self.env.step(action)
+        obs = outputs[0]
+
+        self.pos = self.pos + 1 if self.pos < 2 * self.k - 1 else self.k
+        if self.is_vector_env:
+            self.buffer[:, self.pos] = obs
+            self.buffer[:, self.pos - self.k] = obs
+            # the observation of an env done is the first observation of its next episode
+            done = outputs[2] if len(outputs) == 4 else np.logical_or(outputs[2], outputs[3])
+            for n in np.flatnonzero(done):
+                self.buffer[n] = obs[n]
+        else:
+            self.buffer[self.pos] = obs
+            self.buffer[self.pos - self.k] = obs
+
+        return (self.stack(), *outputs[1:])
+
+    def stack(self):
+        """
+        View of the last k observations in the buffer, from the oldest to the most recent
+        """
+        start = self.pos - self.k + 1
+        if self.is_vector_env:
+            return self.buffer[:, start:self.pos + 1]
+        return self.buffer[start:self.pos + 1]
+
+
+class SparseObsWrapper(ObservationWrapper):
+    """
+    Wrapper replacing the dense observation of a BabaIsYouEnv by the list of the objects in the grid.
+
+    Each object is an (x, y, z, type, color, dir) row of a (max_objects, 6) array, z being the level of the object in
+    its cell, and the valid rows are given by a boolean mask. The list is built from the index of the positions of the
+    objects of the grid and then only the rows of the cells changed at each step are updated, the rows of an object
+    are not ordered. The same arrays are updated in place and returned at each step.
+    """
+
+    def __init__(self, env, max_objects=256):
+        """
+        :param max_objects: maximum number of objects in the grid, a ValueError is raised if the grid contains more
+            objects
+        """
+        super().__init__(env)
+        self.max_objects = max_objects
+
+        width, height = env.observation_space.shape[:2]
+        self.dtype = np.uint8 if max(width, height) <= 256 else np.uint16
+        self.observation_space = spaces.Dict({
+            "objects": spaces.Box(low=0, high=np.iinfo(self.dtype).max, shape=(max_objects, 6), dtype=self.dtype),
+            "mask": spaces.Box(low=0, high=1, shape=(max_objects,), dtype=bool),
+        })
+        self.objects = np.zeros((max_objects, 6), dtype=self.dtype)
+        self.mask = np.zeros((max_objects,), dtype=bool)
+
+        # rows of the objects of each cell and rows not used
+        self._cell_rows = {}
+        self._free_rows = []
+        self._grid = None
+        self._changes = None
+
+    def observation(self, obs):
+        grid = self.unwrapped.grid
+        if grid is not self._grid:
+            # new grid, list the objects of the occupied cells
+            if self._grid is not None:
+                self._grid.untrack_changes(self._changes)
+            self._grid = grid
+            self._changes = grid.track_changes()
+            self.objects[:] = 0
+            self.mask[:] = False
+            self._cell_rows = {}
+            self._free_rows = list(range(self.max_objects - 1, -1, -1))
+            self._update_cells({pos for positions in grid.type_index.values() for pos in positions})
+        elif self._changes:
+            self._update_cells(self._changes)
+        self._changes.clear()
+        return {"objects": self.objects, "mask": self.mask}
+
+    def _update_cells(self, cells):
+        grid = self._grid
+        for i, j in cells:
+            rows = self._cell_rows.pop((i, j), [])
+            depth = int(grid.depth[j, i])
+            # reuse the rows of the cell
+            while len(rows) > depth:
+                row = rows.pop()
+                self.objects[row] = 0
+                self.mask[row] = False
+                self._free_rows.append(row)
+            while len(rows) < depth:
+                if not self._free_rows:
+                    raise ValueError("more than {} objects in the grid".format(self.max_objects))
+                rows.append(self._free_rows.pop())
+            if depth == 0:
+                continue
+
+            records = grid.cells[j, i, :depth]
+            self.objects[rows, 0] = i
+            self.objects[rows, 1] = j
+            self.objects[rows, 2] = np.arange(depth)
+            self.objects[rows, 3] = records[:, FIELD_TYPE]
+            self.objects[rows, 4] = records[:, FIELD_COLOR]
+            self.objects[rows, 5] = records[:, FIELD_DIR]
+            self.mask[rows] = True
+            self._cell_rows[(i, j)] = rows
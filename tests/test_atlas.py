@@ -0,0 +1,60 @@
+import numpy as np
+
+from gym_minigrid.atlas import TileAtlas, atlas_objects, use_atlas
+from gym_minigrid.babaisyou import BabaIsYouGrid
+from gym_minigrid.envs import TestRuleEnv
+from gym_minigrid.envs.core.flexible_world_object import Baba, FBall
+from gym_minigrid.minigrid import Door
+
+
+def test_atlas_save_load(tmp_path):
+    atlas = TileAtlas.build(tile_sizes=(8, 32))
+    path = str(tmp_path / "atlas.bin")
+    atlas.save(path)
+    loaded = TileAtlas.load(path)
+
+    assert loaded.keys == atlas.keys and loaded.subdivs == atlas.subdivs
+    for tile_size in [8, 32]:
+        assert isinstance(loaded.tiles[tile_size], np.memmap)
+        assert np.array_equal(loaded.tiles[tile_size], atlas.tiles[tile_size])
+
+    # the tiles of the atlas are the rendered tiles
+    for obj in [None] + atlas_objects():
+        for highlight in [False, True]:
+            tile = BabaIsYouGrid.draw_tile(obj, highlight, 32).astype(np.uint8)
+            assert np.array_equal(loaded.get_tile(obj, highlight, 32), tile)
+
+
+def test_atlas_lookup():
+    atlas = TileAtlas.build(tile_sizes=(8,))
+
+    # the tile of baba depends on its direction, not the tiles of the other objects
+    babas, balls = [Baba() for _ in range(4)], [FBall() for _ in range(4)]
+    for direction in range(4):
+        babas[direction].dir = balls[direction].dir = direction
+    assert len({atlas.index(baba) for baba in babas}) == 4
+    assert len({atlas.index(ball) for ball in balls}) == 1
+
+    # tiles not in the atlas
+    assert atlas.get_tile(Door("red", is_open=True), tile_size=8) is None
+    assert atlas.get_tile(FBall(), tile_size=32) is None
+
+
+def test_render_with_atlas(tmp_path):
+    env = TestRuleEnv()
+    env.reset()
+    path = str(tmp_path / "atlas.bin")
+    TileAtlas.build().save(path)
+    try:
+        for action in [0, 1, 1, 2, 3]:
+            env.step(action)
+            use_atlas(path)
+            BabaIsYouGrid.tile_cache.clear()
+            img = env.render(mode="rgb_array")
+            # the rendered tiles come from the atlas
+            assert len(BabaIsYouGrid.tile_cache) == 0
+
+            use_atlas(None)
+            assert np.array_equal(img, env.render(mode="rgb_array"))
+    finally:
+        use_atlas(None)
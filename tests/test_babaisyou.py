@@ -26,6 +26,21 @@ class TestWinLoseEnv(BaseGridEnv):
         self.put_obj(Baba(), *self.agent_start_pos)
         self.place_agent()
 
+class TestPushPullEnv(BaseGridEnv):
+    def __init__(self, size=8, **kwargs):
+        self.size = size
+        # the wall is pushed by baba and pulls baba back
+        default_ruleset = {'is_agent': {'baba': True}, 'can_push': {'fwall': True}, 'is_pull': {'fwall': True, 'baba': True}}
+        super().__init__(size=size, default_ruleset=default_ruleset, **kwargs)
+
+    def _gen_grid(self, width, height):
+        self.grid = BabaIsYouGrid(width, height)
+        self.grid.wall_rect(0, 0, width, height)
+        self.agent_start_pos = (5, 3)
+        self.put_obj(FWall(), 6, 3)
+        self.put_obj(Baba(), *self.agent_start_pos)
+        self.place_agent()
+
 class TestPushEnv(BaseGridEnv):
 
     def __init__(self, size=8, collision=1, **kwargs):
@@ -363,3 +378,98 @@ def test_pull_case8():
 # test_pull_case7()
 # test_pull_case8()
 
+
+
+def test_type_index():
+    env = TestPushEnv(collision=3)
+    env.reset()
+    assert env.grid.positions_of(['baba']) == {(1, 5)}
+    assert env.grid.positions_of(['fwall']) == {(2, 5), (3, 5)}
+    assert env.rule_types('is_agent') == {'baba'}
+
+    env.step(env.actions.right)
+    assert env.grid.positions_of(['baba']) == {(2, 5)}
+    assert env.grid.positions_of(['fwall', 'fball']) == {(3, 5), (4, 5), (6, 6)}
+
+    env.grid.set(3, 5, FWall())
+    env.grid.set(3, 5, None)
+    assert env.grid.type_index['fwall'] == {(3, 5): 1, (4, 5): 1}
+
+
+def test_scan_objects():
+    env = TestPushEnv(collision=3)
+    env.reset()
+    visited = []
+    for pos, e in env.scan_objects({'fwall'}):
+        visited.append(pos)
+        if pos == (2, 5):
+            # moved to a cell that hasn't been visited yet
+            env.change_obj_pos(pos, (4, 6))
+    assert visited == [(2, 5), (3, 5), (4, 6)]
+
+
+def test_push_pull_cycle():
+    # Expected: the wall is blocked, baba can't push it and stays in place
+    env = TestPushPullEnv()
+    env.reset()
+    env.step(env.actions.right)
+    assert(isinstance(env.grid.get(5, 3), Baba))
+    assert(isinstance(env.grid.get(6, 3), FWall))
+
+    # Expected: baba moves away and pulls the wall
+    env.step(env.actions.left)
+    assert(isinstance(env.grid.get(4, 3), Baba))
+    assert(isinstance(env.grid.get(5, 3), FWall))
+    assert(env.grid.get(6, 3) is None)
+
+
+def test_get_set_state():
+    import numpy as np
+    from gym_minigrid.envs import GoToObjEnv
+
+    rng = np.random.RandomState(0)
+    env = GoToObjEnv(rdm_rule_pos=True, rdm_ball_pos=True, push_rule_block=True, n_balls=3)
+    env.reset()
+    states = []
+    for _ in range(100):
+        states.append((env.get_state(), env.hash(), env.get_ruleset(), env.gen_obs().copy(), env.step_count))
+        env.step(rng.randint(1, 5))
+
+    for k in rng.permutation(len(states)):
+        state, hash, ruleset, obs, step_count = states[k]
+        env.set_state(state)
+        assert env.hash() == hash
+        assert env.get_ruleset() == ruleset
+        assert np.array_equal(env.gen_obs(), obs)
+        assert env.step_count == step_count
+
+
+def test_zobrist_hash():
+    import numpy as np
+    from gym_minigrid.babaisyou import zobrist_key
+    from gym_minigrid.envs import GoToObjEnv
+
+    def grid_zobrist(grid):
+        records = grid.cells.view(np.uint32)[..., 0]
+        h = 0
+        for j, i in zip(*np.nonzero(grid.depth)):
+            for z in range(grid.depth[j, i]):
+                h ^= zobrist_key(int(i), int(j), z, int(records[j, i, z]))
+        return h
+
+    rng = np.random.RandomState(0)
+    env = GoToObjEnv(rdm_rule_pos=True, rdm_ball_pos=True, push_rule_block=True, n_balls=3)
+    env.reset()
+    states = []
+    for _ in range(100):
+        assert env.grid.zobrist == grid_zobrist(env.grid)
+        states.append((env.get_state(), env.zobrist_hash()))
+        env.step(rng.randint(1, 5))
+
+    # the hash only depends on the state
+    for k in rng.permutation(len(states)):
+        state, zobrist_hash = states[k]
+        env.set_state(state)
+        assert env.zobrist_hash() == zobrist_hash
+    # different states, regardless of the step count, have different hashes
+    assert len({h for _, h in states}) == len({s[8:32] + s[40:] for s, _ in states})
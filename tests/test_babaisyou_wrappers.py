@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+from gym_minigrid.envs import GoToObjEnv, MakeRuleEnv
+from gym_minigrid.envs.core.flexible_world_object import objects, properties
+from gym_minigrid.minigrid import COLOR_TO_IDX, OBJECT_TO_IDX, STATE_TO_IDX
+from gym_minigrid.vector import make_vec
+from gym_minigrid.babaisyou import pack_obj
+from gym_minigrid.wrappers import BabaIsYouOneHotObsWrapper, FrameStackObsWrapper, RulesetObsWrapper, SparseObsWrapper
+
+
+def test_one_hot_obs():
+    for encoding_level in [1, 3]:
+        env = BabaIsYouOneHotObsWrapper(GoToObjEnv(encoding_level=encoding_level, push_rule_block=True))
+        obs = env.reset(seed=0)
+        assert env.observation_space.contains(obs)
+        rng = np.random.RandomState(0)
+        for _ in range(20):
+            obs, _, done, _ = env.step(rng.randint(5))
+            # the observation is written in the same buffer
+            assert obs is env.out
+
+            encoded = env.unwrapped.gen_obs()
+            expected = np.zeros_like(obs)
+            for i in range(encoded.shape[0]):
+                for j in range(encoded.shape[1]):
+                    for level in range(encoding_level):
+                        type, color, state = encoded[i, j, 3 * level:3 * level + 3]
+                        offset = level * env.num_bits
+                        expected[i, j, offset + type] = 1
+                        expected[i, j, offset + len(OBJECT_TO_IDX) + color] = 1
+                        expected[i, j, offset + len(OBJECT_TO_IDX) + len(COLOR_TO_IDX) + state] = 1
+            assert np.array_equal(obs, expected)
+            assert env.num_bits == len(OBJECT_TO_IDX) + len(COLOR_TO_IDX) + len(STATE_TO_IDX)
+            if done:
+                env.reset()
+
+
+def test_ruleset_obs():
+    np.random.seed(0)
+    env = RulesetObsWrapper(MakeRuleEnv())
+    obs = env.reset()
+    assert env.observation_space.contains(obs)
+    rng = np.random.RandomState(0)
+    for _ in range(100):
+        prev_rules = obs["rules"]
+        obs, _, done, _ = env.step(rng.randint(5))
+        ruleset = env.unwrapped.get_ruleset()
+        expected = [[bool(ruleset.get(prop, {}).get(obj, False)) for prop in properties] for obj in objects]
+        assert np.array_equal(obs["rules"], expected)
+        # the array is only replaced when the rules change
+        assert (obs["rules"] is prev_rules) == np.array_equal(obs["rules"], prev_rules)
+        if done:
+            obs = env.reset()
+
+    # break the rules by removing the 'is' blocks
+    env = RulesetObsWrapper(GoToObjEnv())
+    obs = env.reset()
+    grid = env.unwrapped.grid
+    for j in range(grid.height):
+        for i in range(grid.width):
+            if grid.get(i, j) is not None and grid.get(i, j).type == 'rule_is':
+                grid.set(i, j, None)
+    prev_rules = obs["rules"]
+    obs, _, _, _ = env.step(env.actions.left)
+    assert prev_rules.any() and obs["rules"] is not prev_rules
+    ruleset = env.unwrapped.get_ruleset()
+    expected = [[bool(ruleset.get(prop, {}).get(obj, False)) for prop in properties] for obj in objects]
+    assert np.array_equal(obs["rules"], expected)
+
+
+def test_frame_stack():
+    env = FrameStackObsWrapper(GoToObjEnv(rdm_ball_pos=True), k=3)
+    obs = env.reset(seed=0)
+    assert env.observation_space.contains(obs)
+    frames = [obs[-1].copy()] * 3
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+        obs, _, done, _ = env.step(rng.randint(5))
+        frames = frames[1:] + [env.unwrapped.gen_obs().copy()]
+        assert np.array_equal(obs, frames)
+        # the stack is a view of the buffer
+        assert obs.base is env.buffer
+        if done:
+            obs = env.reset()
+            frames = [obs[-1].copy()] * 3
+
+
+def test_frame_stack_vec():
+    env = FrameStackObsWrapper(make_vec("BabaIsYou-GoToObj-v0", 3, rdm_ball_pos=True, push_rule_block=True), k=4)
+    obs = env.reset(seed=0)
+    assert obs.shape == env.observation_space.shape == (3, 4, 8, 8, 3)
+    frames = [[o.copy()] * 4 for o in obs[:, -1]]
+    rng = np.random.RandomState(0)
+    n_dones = 0
+    for _ in range(100):
+        obs, _, done, _ = env.step(rng.randint(5, size=3))
+        for n in range(3):
+            last = obs[n, -1].copy()
+            assert np.array_equal(last, env.envs[n].grid.encode())
+            # the stack of an env done starts again with the first observation of the next episode
+            frames[n] = [last] * 4 if done[n] else frames[n][1:] + [last]
+            assert np.array_equal(obs[n], frames[n])
+        n_dones += done.sum()
+    assert n_dones > 0
+
+
+def test_sparse_obs():
+    np.random.seed(0)
+    env = SparseObsWrapper(MakeRuleEnv(), max_objects=64)
+    obs = env.reset()
+    assert env.observation_space.contains(obs)
+    rng = np.random.RandomState(0)
+    for _ in range(100):
+        obs, _, done, _ = env.step(rng.randint(5))
+        grid = env.unwrapped.grid
+        expected = sorted(
+            (i, j, z, *(int(x) for x in pack_obj(obj)[:3]))
+            for j in range(grid.height) for i in range(grid.width)
+            for z, obj in enumerate(o for o in grid.grid[j * grid.width + i] if o is not None)
+        )
+        assert sorted(tuple(int(x) for x in row) for row in obs["objects"][obs["mask"]]) == expected
+        assert not obs["objects"][~obs["mask"]].any()
+        if done:
+            env.reset()
+
+    env = SparseObsWrapper(MakeRuleEnv(), max_objects=8)
+    with pytest.raises(ValueError):
+        env.reset()
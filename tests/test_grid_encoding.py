@@ -2,8 +2,9 @@ import numpy as np
 from matplotlib import pyplot as plt
 
 from gym_minigrid import BabaIsYouGrid
-from gym_minigrid.envs.core.flexible_world_object import FBall, Baba
+from gym_minigrid.envs.core.flexible_world_object import FBall, Baba, RuleIs
 from gym_minigrid.envs.goto import BaseGridEnv
+from gym_minigrid.minigrid import OBJECT_TO_IDX
 
 class TestEnv(BaseGridEnv):
     def __init__(self, ball_pos, baba_pos, size=8, **kwargs):
@@ -54,4 +55,114 @@ def test_grid_encoding1():
     #     plt.show()
     #
     # plot(obs1)
-    # plot(obs2)
\ No newline at end of file
+    # plot(obs2)
+
+def test_packed_cells():
+    grid = BabaIsYouGrid(5, 5, max_stack=2)
+    ball, baba = FBall(), Baba()
+    baba.dir = 3
+    grid.set(2, 3, ball)
+    grid.set(2, 3, baba)
+    grid.set(2, 3, FBall())
+    assert grid.max_stack == 4
+    assert grid.depth[3, 2] == 3
+    assert tuple(grid.cells[3, 2, 0]) == (*ball.encode()[:2], 0, 0)
+    assert tuple(grid.cells[3, 2, 1]) == (*baba.encode()[:2], 3, 0)
+
+    grid.set(2, 3, None)
+    assert grid.get(2, 3) is baba
+    baba.dir = 1
+    grid.refresh(2, 3)
+    assert grid.cells[3, 2, 1, 2] == 1
+
+    grid.set(2, 3, None)
+    grid.set(2, 3, None)
+    grid.set(2, 3, None)
+    assert grid.depth[3, 2] == 0
+    assert np.all(grid.cells[:, :, :, 0] == OBJECT_TO_IDX["empty"])
+
+
+def _encode_reference(grid, vis_mask):
+    array = np.zeros((grid.width, grid.height, 3*grid.encoding_level), dtype="uint8")
+    for i in range(grid.width):
+        for j in range(grid.height):
+            if vis_mask[i, j]:
+                for idx in range(grid.encoding_level):
+                    array[i, j, idx*3:(idx+1)*3] = grid.encode_cell(grid.get(i, j, -(idx+1)))
+    return array
+
+
+def test_grid_encoding_matches_reference():
+    rng = np.random.RandomState(0)
+    grid = BabaIsYouGrid(7, 5)
+    grid.wall_rect(0, 0, 7, 5)
+    for _ in range(30):
+        obj = [FBall, Baba, RuleIs][rng.randint(3)]()
+        grid.set(rng.randint(7), rng.randint(5), obj)
+    vis_mask = rng.rand(7, 5) > 0.3
+
+    for encoding_level in [1, 2, 3, 6]:
+        grid.encoding_level = encoding_level
+        for mask in [None, vis_mask]:
+            expected = _encode_reference(grid, np.ones((7, 5), dtype=bool) if mask is None else mask)
+            obs = grid.encode(mask)
+            assert obs.dtype == np.uint8
+            assert obs.shape == expected.shape
+            assert obs.tobytes() == expected.tobytes()
+
+            out = np.full(expected.shape, 255, dtype=np.uint8)
+            assert grid.encode(mask, out=out) is out
+            assert np.array_equal(out, expected)
+
+
+def test_grid_change_tracking():
+    grid = BabaIsYouGrid(5, 5)
+    changes = grid.track_changes()
+    grid.set(1, 2, FBall())
+    grid.set(3, 3, None)
+    assert changes == {(1, 2)}
+    changes.clear()
+
+    grid_copy = grid.copy()
+    grid_copy.set(2, 2, FBall())
+    assert len(changes) == 0
+
+    grid.untrack_changes(changes)
+    grid.set(1, 2, None)
+    assert len(changes) == 0
+
+
+def test_incremental_obs():
+    env = TestEnv(ball_pos=(5, 4), baba_pos=(2, 2), default_ruleset={'is_agent': {'baba': True}})
+    obs = env.reset()
+    for action in [env.actions.right, env.actions.down, env.actions.down, env.actions.idle, env.actions.right]:
+        new_obs, _, _, _ = env.step(action)
+        # the observation is patched in place
+        assert new_obs is obs
+        assert np.array_equal(new_obs, env.grid.encode())
+
+    env = TestEnv(ball_pos=(5, 4), baba_pos=(2, 2), default_ruleset={'is_agent': {'baba': True}}, copy_obs=True)
+    obs = env.reset()
+    new_obs, _, _, _ = env.step(env.actions.right)
+    assert new_obs is not obs
+    assert not np.array_equal(new_obs, obs)
+    assert np.array_equal(new_obs, env.grid.encode())
+
+
+def test_obs_buffer():
+    batch = np.zeros((2, 8, 8, 6), dtype=np.uint8)
+    env = TestEnv(ball_pos=(5, 4), baba_pos=(2, 2), default_ruleset={'is_agent': {'baba': True}}, encoding_level=2,
+                  obs_buffer=batch[1], copy_obs=True)
+    obs = env.reset()
+    assert obs.base is batch
+    for action in [env.actions.right, env.actions.down, env.actions.idle]:
+        obs, _, _, _ = env.step(action)
+        # the observation is written in the slice of the batch
+        assert obs.base is batch
+        assert np.array_equal(batch[1], env.grid.encode())
+    assert not batch[0].any()
+
+    # back to an array owned by the env
+    env.set_obs_buffer(None)
+    obs = env.step(env.actions.left)[0]
+    assert obs.base is not batch and np.array_equal(obs, env.grid.encode())
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+pygame = pytest.importorskip("pygame")
+pytest.importorskip("gymnasium")
+
+from gym.utils.play import display_arr
+
+from gym_minigrid import play_game
+from gym_minigrid.envs import GoToObjEnv
+
+KEYS_TO_ACTION = {(ord('z'),): 1, (ord('d'),): 2, (ord('s'),): 3, (ord('q'),): 4}
+
+
+def play_headless(monkeypatch, env, zoom=None, n_frames=30, callback=None):
+    """
+    Play random moves in a dummy window, return the number of frames where the screen differs from a full redraw
+    """
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    rng = np.random.RandomState(0)
+    n_mismatches = []
+
+    class Clock:
+        # called at the end of each frame, checks the screen and presses the key of the next frame
+        def tick(self, fps):
+            screen = pygame.display.get_surface()
+            full = pygame.Surface(screen.get_size())
+            display_arr(full, env.render(mode="rgb_array"), video_size=screen.get_size(), transpose=True)
+            n_mismatches.append(not np.array_equal(pygame.surfarray.array3d(screen),
+                                                   pygame.surfarray.array3d(full)))
+            if len(n_mismatches) < n_frames:
+                key = [ord('z'), ord('d'), ord('s'), ord('q')][rng.randint(4)]
+                pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+            else:
+                pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    monkeypatch.setattr(pygame.time, "Clock", Clock)
+    play_game.play(env, fps=1000, zoom=zoom, callback=callback, keys_to_action=KEYS_TO_ACTION)
+    return sum(n_mismatches)
+
+
+@pytest.mark.parametrize("zoom", [None, 2, 1.37, 0.5])
+def test_play_changed_tiles(monkeypatch, zoom):
+    env = GoToObjEnv(size=12, rdm_ball_pos=True, n_balls=10)
+    uploads = []
+    display_cells = play_game.display_cells
+    monkeypatch.setattr(play_game, "display_cells", lambda *args: uploads.append(1) or display_cells(*args))
+
+    assert play_headless(monkeypatch, env, zoom=zoom) == 0
+    assert len(uploads) > 0
+    assert env.copy_frame
+
+
+def test_play_restores_env(monkeypatch):
+    env = GoToObjEnv()
+    n_trackers = []
+
+    def callback(*args):
+        n_trackers.append(len(env.grid._change_trackers))
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        play_headless(monkeypatch, env, callback=callback)
+    # the env returns copies of its frame again and the changes of its grid are no longer tracked by play
+    assert env.copy_frame
+    assert len(env.grid._change_trackers) == n_trackers[0] - 1
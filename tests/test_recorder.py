@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from gym_minigrid.envs import GoToObjEnv
+from gym_minigrid.wrappers import VideoRecorder
+
+
+def test_video_recorder_images(tmp_path):
+    env = GoToObjEnv(rdm_rule_pos=True, rdm_ball_pos=True, push_rule_block=True)
+    recorder = VideoRecorder(env, str(tmp_path / "{:04d}.png"), tile_size=8, max_queue=4)
+    recorder.reset(seed=0)
+    frames = [env.render(mode="rgb_array", tile_size=8)]
+    rng = np.random.RandomState(0)
+    for _ in range(30):
+        _, _, done, _ = recorder.step(rng.randint(5))
+        frames.append(env.render(mode="rgb_array", tile_size=8))
+        if done:
+            recorder.reset()
+            frames.append(env.render(mode="rgb_array", tile_size=8))
+    recorder.close()
+
+    assert recorder.n_frames == len(frames)
+    for k, frame in enumerate(frames):
+        img = cv2.imread(str(tmp_path / "{:04d}.png".format(k)))
+        assert np.array_equal(img[..., ::-1], frame)
+
+
+def test_video_recorder_video(tmp_path):
+    path = str(tmp_path / "episode.avi")
+    recorder = VideoRecorder(GoToObjEnv(), path, tile_size=8, fourcc="MJPG")
+    recorder.reset()
+    for _ in range(10):
+        recorder.step(recorder.action_space.sample())
+    recorder.flush()
+    assert recorder.n_frames == 11
+    recorder.close()
+
+    video = cv2.VideoCapture(path)
+    assert int(video.get(cv2.CAP_PROP_FRAME_COUNT)) == 11
+    video.release()
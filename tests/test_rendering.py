@@ -0,0 +1,159 @@
+import math
+
+import numpy as np
+
+from gym_minigrid.babaisyou import BabaIsYouGrid
+from gym_minigrid.envs.core.flexible_world_object import Baba, FBall
+from gym_minigrid.rendering import (
+    TileCache,
+    fill_coords,
+    highlight_img_int,
+    point_in_circle,
+    point_in_line,
+    point_in_rect,
+    point_in_triangle,
+    rotate_fn,
+)
+
+
+def fill_coords_reference(img, fn, color):
+    # evaluate the filter function pixel by pixel
+    for y in range(img.shape[0]):
+        for x in range(img.shape[1]):
+            yf = (y + 0.5) / img.shape[0]
+            xf = (x + 0.5) / img.shape[1]
+            if fn(xf, yf):
+                img[y, x] = color
+    return img
+
+
+def test_fill_coords():
+    tri_fn = point_in_triangle((0.12, 0.19), (0.87, 0.50), (0.12, 0.81))
+    fns = [
+        point_in_rect(0.06, 0.94, 0.06, 0.94),
+        point_in_rect(0, 0.031, 0, 1),
+        point_in_circle(0.5, 0.5, 0.31),
+        point_in_line(0.1, 0.3, 0.3, 0.7, r=0.03),
+        tri_fn,
+    ] + [rotate_fn(tri_fn, cx=0.5, cy=0.5, theta=0.5 * math.pi * d) for d in range(4)]
+
+    for shape in [(96, 96, 3), (24, 36, 3)]:
+        for fn in fns:
+            img = np.zeros(shape, dtype=np.uint8)
+            expected = fill_coords_reference(img.copy(), fn, (255, 0, 0))
+            assert np.array_equal(fill_coords(img, fn, (255, 0, 0)), expected)
+
+
+def test_render_tile_direction():
+    BabaIsYouGrid.tile_cache.clear()
+    tiles = []
+    for direction in range(4):
+        baba = Baba()
+        baba.dir = direction
+        tiles.append(BabaIsYouGrid.render_tile(baba, tile_size=16))
+        assert np.array_equal(tiles[-1], BabaIsYouGrid.draw_tile(baba, tile_size=16).astype(np.uint8))
+    assert all(not np.array_equal(tiles[0], tile) for tile in tiles[1:])
+
+    BabaIsYouGrid.render_tile(baba, tile_size=16)
+    stats = BabaIsYouGrid.tile_cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 4 and stats["tiles"] == 4
+
+
+def test_tile_cache_eviction():
+    tile_nbytes = 8 * 8 * 3
+    cache = TileCache(max_bytes=3 * tile_nbytes)
+    for k in range(3):
+        cache.put(k, np.zeros((8, 8, 3), dtype=np.uint8))
+    assert cache.get(0) is not None
+
+    # the least recently used tile is evicted
+    cache.put(3, np.zeros((8, 8, 3), dtype=np.uint8))
+    assert 1 not in cache and 0 in cache and 3 in cache
+    assert cache.get(1) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 1, "tiles": 3, "nbytes": 3 * tile_nbytes,
+                             "max_bytes": 3 * tile_nbytes}
+
+    ball = FBall()
+    BabaIsYouGrid.tile_cache.clear()
+    BabaIsYouGrid.render_tile(ball, tile_size=8)
+    assert BabaIsYouGrid.tile_cache.nbytes == tile_nbytes
+
+
+def test_render_grid():
+    from gym_minigrid.envs import TestRuleEnv
+    env = TestRuleEnv()
+    env.reset(seed=0)
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+        env.step(rng.randint(4))
+        grid = env.grid
+        highlight_mask = rng.rand(grid.width, grid.height) < 0.3
+        for mask in [None, highlight_mask]:
+            img = grid.render(8, highlight_mask=mask)
+
+            # render the grid tile by tile
+            expected = np.zeros_like(img)
+            for j in range(grid.height):
+                for i in range(grid.width):
+                    tile = BabaIsYouGrid.render_tile(grid.get(i, j), highlight=mask is not None and mask[i, j],
+                                                     tile_size=8)
+                    expected[j * 8:(j + 1) * 8, i * 8:(i + 1) * 8] = tile
+            assert np.array_equal(img, expected)
+
+
+def test_rule_block_labels():
+    from gym_minigrid.envs.core.flexible_world_object import RuleObject, label_image
+    blocks = [RuleObject('fball'), RuleObject('fball'), RuleObject('fwall')]
+    # the label images are shared by the blocks with the same name
+    assert blocks[0].img is blocks[1].img and blocks[0].img is not blocks[2].img
+    assert not blocks[0].img.flags.writeable
+    assert label_image('ball', 20) is label_image('ball', 20)
+
+    for tile_size in [8, 32]:
+        BabaIsYouGrid.tile_cache.clear()
+        assert not np.array_equal(BabaIsYouGrid.render_tile(blocks[0], tile_size=tile_size),
+                                  BabaIsYouGrid.render_tile(blocks[2], tile_size=tile_size))
+
+
+def test_incremental_frame():
+    from gym_minigrid.envs import GoToObjEnv
+    env = GoToObjEnv(rdm_rule_pos=True, rdm_ball_pos=True, push_rule_block=True, copy_frame=False)
+    env.reset(seed=0)
+    frame = env.render(mode="rgb_array", tile_size=8)
+    rng = np.random.RandomState(0)
+    for _ in range(100):
+        _, _, done, _ = env.step(rng.randint(5))
+        if done:
+            env.reset()
+        img = env.render(mode="rgb_array", tile_size=8)
+        assert np.array_equal(img, env.grid.render(8))
+        # the frame is updated in place while the grid is the same
+        assert (img is frame) != done
+        frame = img
+    assert env.render(mode="rgb_array", tile_size=12).shape == env.grid.render(12).shape
+
+
+def test_render_without_antialiasing():
+    from gym_minigrid.envs import TestRuleEnv
+    from gym_minigrid.rendering import highlight_img
+
+    img = np.random.RandomState(0).randint(0, 256, (8, 8, 3)).astype(np.uint8)
+    expected, highlighted = img.copy(), img.copy()
+    highlight_img(expected)
+    highlight_img_int(highlighted)
+    assert np.abs(expected.astype(int) - highlighted).max() <= 1
+
+    env = TestRuleEnv(antialias=False)
+    env.reset()
+    img = env.render(mode="rgb_array", tile_size=8)
+    assert np.array_equal(img, env.grid.render(8, subdivs=1))
+    assert not np.array_equal(img, env.grid.render(8))
+
+    # the tiles are drawn at the pixel centers
+    ball = FBall()
+    tile = BabaIsYouGrid.render_tile(ball, tile_size=8, subdivs=1)
+    expected = np.zeros((8, 8, 3), dtype=np.uint8)
+    fill_coords(expected, point_in_rect(0, 0.031, 0, 1), (100, 100, 100))
+    fill_coords(expected, point_in_rect(0, 1, 0, 0.031), (100, 100, 100))
+    ball.render(expected)
+    assert tile.dtype == np.uint8 and np.array_equal(tile, expected)
@@ -0,0 +1,61 @@
+import numpy as np
+
+from gym_minigrid import BabaIsYouGrid
+from gym_minigrid.envs.core.flexible_world_object import FBall, FWall, RuleIs, RuleObject, RuleProperty
+from gym_minigrid.rule import IncrementalRuleset, compile_ruleset, extract_ruleset
+
+
+def test_incremental_ruleset():
+    rng = np.random.RandomState(0)
+    size = 4
+    grid = BabaIsYouGrid(size, size)
+    blocks = [RuleObject('fball'), RuleObject('baba'), RuleIs(), RuleIs(), RuleIs(),
+              RuleProperty('is_goal'), RuleProperty('is_agent'), RuleProperty('can_push'), FBall()]
+    positions = []
+    for block in blocks:
+        pos = (rng.randint(size), rng.randint(size))
+        grid.set(*pos, block)
+        positions.append(pos)
+
+    default_ruleset = {'is_agent': {'baba': True}}
+    rules = IncrementalRuleset(grid, default_ruleset=default_ruleset)
+    assert rules.ruleset == extract_ruleset(grid, default_ruleset={'is_agent': {'baba': True}})
+
+    n_changes = 0
+    for _ in range(500):
+        # move a random block to a random cell
+        k = rng.randint(len(blocks))
+        i, j = positions[k]
+        if grid.get(i, j) is not blocks[k]:
+            continue
+        grid.set(i, j, None)
+        positions[k] = (rng.randint(size), rng.randint(size))
+        grid.set(*positions[k], blocks[k])
+
+        version = rules.version
+        ruleset = rules.update()
+        assert ruleset == extract_ruleset(grid, default_ruleset={'is_agent': {'baba': True}})
+        n_changes += rules.version != version
+    assert n_changes > 0
+
+    # no change in the grid, same ruleset
+    assert rules.update() is ruleset
+
+    # the rules found in the grid are not added to the default ruleset
+    assert default_ruleset == {'is_agent': {'baba': True}}
+
+
+def test_compiled_rule_masks():
+    ruleset = {'is_pull': {'fwall': True}, 'can_push': {'fball': True, 'fwall': False}, 'is_goal': {}}
+    rule_masks = compile_ruleset(ruleset)
+
+    wall, ball = FWall(), FBall()
+    wall.set_rule_masks(rule_masks)
+    ball.set_rule_masks(rule_masks)
+    assert wall.is_pull() and wall.is_block() and not wall.can_overlap() and not wall.can_push()
+    assert ball.can_push() and not ball.is_block() and ball.can_overlap()
+
+    # the masks are updated in place, the objects see the new rules
+    compile_ruleset({'is_agent': {'fball': True}}, rule_masks)
+    assert not wall.is_pull() and not wall.is_block()
+    assert ball.is_agent() and ball.is_block() and not ball.can_push()
@@ -0,0 +1,100 @@
+import numpy as np
+
+from gym_minigrid.envs import GoToObjEnv, MakeRuleEnv, MoveObjEnv, OpenShutObjEnv
+from gym_minigrid.envs.core.flexible_world_object import FBall
+from gym_minigrid.vector import BabaIsYouVecEngine, make_vec
+
+
+def test_vec_engine():
+    np.random.seed(0)
+    rng = np.random.RandomState(0)
+    for make_env in [lambda: GoToObjEnv(rdm_rule_pos=True, rdm_ball_pos=True, push_rule_block=True), MakeRuleEnv]:
+        env = BabaIsYouVecEngine([make_env for _ in range(4)])
+        obs = env.reset(seed=0)
+        assert obs.shape == env.observation_space.shape
+
+        n_dones = 0
+        for _ in range(300):
+            obs, reward, done, info = env.step(rng.randint(0, 5, size=4))
+            n_dones += done.sum()
+            # the batch of observations matches the observations of the envs
+            for k, e in enumerate(env.envs):
+                assert np.array_equal(obs[k], e.grid.encode())
+                assert info.get("_final_observation", done)[k] == done[k]
+        assert n_dones > 0
+
+
+def test_vec_engine_matches_step():
+    rng = np.random.RandomState(0)
+    make_envs = [lambda: GoToObjEnv(rdm_rule_pos=True, rdm_ball_pos=True, push_rule_block=True), GoToObjEnv,
+                 MakeRuleEnv, MoveObjEnv, OpenShutObjEnv]
+    for make_env in make_envs:
+        env = BabaIsYouVecEngine([make_env for _ in range(8)])
+        ref_envs = [make_env() for _ in range(8)]
+        np.random.seed(0)
+        env.reset(seed=0)
+        np.random.seed(0)
+        for k, ref_env in enumerate(ref_envs):
+            ref_env.reset(seed=k)
+
+        # compare each env with an env stepped by step until its first episode ends
+        running = np.ones(8, dtype=bool)
+        for _ in range(200):
+            actions = rng.randint(0, 5, size=8)
+            obs, reward, done, info = env.step(actions)
+            for k in np.flatnonzero(running):
+                e, ref_env = env.envs[k], ref_envs[k]
+                ref_obs, ref_reward, ref_done, _ = ref_env.step(actions[k])
+                assert np.array_equal(info["final_observation"][k] if done[k] else obs[k], ref_obs)
+                assert (reward[k], done[k]) == (ref_reward, ref_done)
+                if done[k]:
+                    running[k] = False
+                    continue
+                assert tuple(e.agent_pos) == tuple(ref_env.agent_pos) and e.agent_dir == ref_env.agent_dir
+                assert e.grid.zobrist == ref_env.grid.zobrist
+                assert e.get_ruleset() == ref_env.get_ruleset()
+                assert [[type(obj) for obj in cell] for cell in e.grid.grid] == \
+                       [[type(obj) for obj in cell] for cell in ref_env.grid.grid]
+
+
+def test_vec_engine_grow_stacks():
+    env = BabaIsYouVecEngine([GoToObjEnv for _ in range(2)], copy=False)
+    env.reset()
+    grid = env.envs[1].grid
+    for _ in range(grid.max_stack + 1):
+        grid.set(1, 1, FBall())
+    obs, _, _, _ = env.step(np.zeros(2, dtype=int))
+    assert env.cells.shape[3] >= grid.max_stack
+    assert np.array_equal(obs[1], grid.encode())
+
+
+def test_make_vec():
+    env = make_vec("BabaIsYou-GoToObj-v0", 3)
+    obs = env.reset()
+    assert obs.shape == (3, *env.single_observation_space.shape)
+    obs, reward, done, info = env.step(env.action_space.sample())
+    assert obs.shape == (3, *env.single_observation_space.shape)
+    assert reward.shape == done.shape == (3,)
+
+
+def test_render_frames():
+    env = make_vec("BabaIsYou-GoToObj-v0", 3, rdm_rule_pos=True, rdm_ball_pos=True)
+    env.reset(seed=0)
+    frames = np.zeros((3, 8 * env.envs[0].height, 8 * env.envs[0].width, 3), dtype=np.uint8)
+    for _ in range(10):
+        env.step(env.action_space.sample())
+        assert env.render_frames(tile_size=8, out=frames) is frames
+        for k, e in enumerate(env.envs):
+            assert np.array_equal(frames[k], e.render(mode="rgb_array", tile_size=8))
+
+
+def test_vec_engine_out():
+    out = np.zeros((3, 8, 8, 3), dtype=np.uint8)
+    env = make_vec("BabaIsYou-GoToObj-v0", 2, copy=False, out=out[1:])
+    obs = env.reset(seed=0)
+    assert obs.base is out
+    for _ in range(5):
+        obs, _, _, _ = env.step(env.action_space.sample())
+        assert obs.base is out
+        assert all(np.array_equal(out[1 + k], e.grid.encode()) for k, e in enumerate(env.envs))
+    assert not out[0].any()